@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+Compares reading the names out of a large REST listing by building an element
+tree (the way listings used to be read) with geoserver.support.index_entries.
+
+    python benchmarks/index_parsing.py [entries] [repeat]
+"""
+
+import sys
+from timeit import repeat
+from xml.etree.ElementTree import XML
+from geoserver.support import index_entries
+
+entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+entry = ('<layer><name>layer_%d</name><atom:link '
+        'xmlns:atom="http://www.w3.org/2005/Atom" rel="alternate" '
+        'href="http://localhost:8080/geoserver/rest/layers/layer_%d.xml" '
+        'type="application/xml"/></layer>')
+listing = "<layers>%s</layers>" % "".join(entry % (i, i) for i in xrange(entries))
+
+def element_tree():
+    return [n.find("name").text for n in XML(listing).findall("layer")]
+
+def expat():
+    return [name for name, href in index_entries(listing, "layer")]
+
+assert element_tree() == expat()
+
+print "%d entries, %.1f MB, best of %d runs" % (entries, len(listing) / 1e6, runs)
+baseline = None
+for function in (element_tree, expat):
+    best = min(repeat(function, number=1, repeat=runs))
+    baseline = baseline or best
+    print "  %-12s %7.3f s  %5.2fx" % (function.__name__, best, baseline / best)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Measures the memory held by a large number of fetched FeatureTypes, with
+their documents kept and after ResourceInfo.compact(), and by unfetched
+stubs.  No server is needed; every resource gets a copy of the same
+synthetic document.
+
+    python benchmarks/model_memory.py [resources]
+
+Allocations are counted with tracemalloc where it is available (Python 3, or
+Python 2 with pytracemalloc).  Otherwise the objects are walked with
+gc.get_referents and the sys.getsizeof of everything reachable from them is
+added up, leaving out what they share with the rest of the process (the
+catalog, workspace and store, classes and modules).  That misses allocator
+overhead, so it reads a little lower than tracemalloc, but unlike the
+resident set size it doesn't depend on what the allocator happens to hand
+back to the OS.
+"""
+
+import gc
+import sys
+from types import ModuleType
+from xml.etree.ElementTree import XML
+from geoserver.resource import FeatureType
+from geoserver.store import DataStore
+from geoserver.workspace import Workspace
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+resources = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+document = """<featureType>
+  <name>roads</name>
+  <nativeName>roads</nativeName>
+  <namespace><name>topp</name></namespace>
+  <title>Roads</title>
+  <abstract>Major roads of the region, from the state transportation office.</abstract>
+  <keywords><string>roads</string><string>transportation</string></keywords>
+  <srs>EPSG:4326</srs>
+  <nativeBoundingBox><minx>-109.05</minx><maxx>-102.04</maxx><miny>36.99</miny><maxy>41.0</maxy><crs>EPSG:4326</crs></nativeBoundingBox>
+  <latLonBoundingBox><minx>-109.05</minx><maxx>-102.04</maxx><miny>36.99</miny><maxy>41.0</maxy><crs>EPSG:4326</crs></latLonBoundingBox>
+  <projectionPolicy>FORCE_DECLARED</projectionPolicy>
+  <enabled>true</enabled>
+  <metadata><entry key="cachingEnabled">false</entry></metadata>
+  <attributes>
+    <attribute><name>the_geom</name><minOccurs>0</minOccurs><maxOccurs>1</maxOccurs><nillable>true</nillable></attribute>
+    <attribute><name>name</name><minOccurs>0</minOccurs><maxOccurs>1</maxOccurs><nillable>true</nillable></attribute>
+    <attribute><name>class</name><minOccurs>0</minOccurs><maxOccurs>1</maxOccurs><nillable>true</nillable></attribute>
+  </attributes>
+</featureType>"""
+
+class OfflineCatalog(object):
+    service_url = "http://localhost:8080/geoserver/rest"
+
+    def get_xml(self, url):
+        return XML(document)
+
+def reachable_size(roots, shared):
+    """The total size of the objects reachable from roots but not shared."""
+    seen = set(id(obj) for obj in shared)
+    pending = list(roots)
+    total = 0
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, (type, ModuleType)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        pending.extend(gc.get_referents(obj))
+    return total
+
+def measure(build):
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        objects = build()
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        objects = build()
+        used = reachable_size(objects, [catalog, workspace, store])
+    return objects, used
+
+catalog = OfflineCatalog()
+workspace = Workspace(catalog, "topp")
+store = DataStore(catalog, workspace, "roads")
+
+def stubs():
+    return [FeatureType(catalog, workspace, store, "roads_%d" % i)
+            for i in xrange(resources)]
+
+def fetched():
+    objects = stubs()
+    for obj in objects:
+        obj.fetch()
+    return objects
+
+def compacted():
+    objects = stubs()
+    for obj in objects:
+        obj.fetch()
+        obj.compact(["title", "latlon_bbox"])
+    return objects
+
+print "%d resources, measured with %s" % (resources,
+        "tracemalloc" if tracemalloc is not None else "sys.getsizeof")
+for build in (stubs, fetched, compacted):
+    objects, used = measure(build)
+    print "  %-10s %8.1f MB  %6d bytes each" % (build.__name__,
+            used / 1e6, used / resources)
+    del objects
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Compares reading the XML properties of many fetched FeatureTypes through the
+compiled, memoizing decoder with the uncompiled descriptors gsconfig used
+before, which searched the document and ran the converter on every read.
+
+    python benchmarks/property_decoding.py [resources] [reads]
+
+Every resource gets its own parse of the same synthetic document, and each
+of its properties is read ``reads`` times.
+"""
+
+import sys
+from time import time
+from xml.etree.ElementTree import XML
+from geoserver.resource import FeatureType
+from geoserver.store import DataStore
+from geoserver.support import _XMLProperty
+from geoserver.workspace import Workspace
+
+resources = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+reads = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+document = """<featureType>
+  <name>roads</name>
+  <title>Roads</title>
+  <abstract>Major roads of the region.</abstract>
+  <keywords><string>roads</string><string>transportation</string></keywords>
+  <srs>EPSG:4326</srs>
+  <nativeBoundingBox><minx>-109.05</minx><maxx>-102.04</maxx><miny>36.99</miny><maxy>41.0</maxy><crs>EPSG:4326</crs></nativeBoundingBox>
+  <latLonBoundingBox><minx>-109.05</minx><maxx>-102.04</maxx><miny>36.99</miny><maxy>41.0</maxy><crs>EPSG:4326</crs></latLonBoundingBox>
+  <projectionPolicy>FORCE_DECLARED</projectionPolicy>
+  <enabled>true</enabled>
+  <metadata><entry key="cachingEnabled">false</entry></metadata>
+  <attributes>
+    <attribute><name>the_geom</name></attribute>
+    <attribute><name>name</name></attribute>
+  </attributes>
+</featureType>"""
+
+def uncompiled(path, converter):
+    def get(self):
+        if path in self.dirty:
+            return self.dirty[path]
+        else:
+            if self.dom is None:
+                self.fetch()
+            node = self.dom.find(path)
+            return converter(self.dom.find(path)) if node is not None else None
+    return property(get)
+
+properties = sorted(name for name, attr in vars(FeatureType).items()
+        if isinstance(attr, _XMLProperty))
+
+class UncompiledFeatureType(FeatureType):
+    pass
+
+for name in properties:
+    prop = getattr(FeatureType, name)
+    setattr(UncompiledFeatureType, name, uncompiled(prop.path, prop.converter))
+
+class OfflineCatalog(object):
+    service_url = "http://localhost:8080/geoserver/rest"
+
+catalog = OfflineCatalog()
+workspace = Workspace(catalog, "topp")
+store = DataStore(catalog, workspace, "roads")
+
+def run(cls):
+    objects = []
+    for i in xrange(resources):
+        obj = cls(catalog, workspace, store, "roads_%d" % i)
+        obj.dom = XML(document)
+        objects.append(obj)
+    start = time()
+    for obj in objects:
+        for i in xrange(reads):
+            for name in properties:
+                getattr(obj, name)
+    return time() - start
+
+print "%d resources, %d properties read %d times each" % (
+        resources, len(properties), reads)
+baseline = run(UncompiledFeatureType)
+compiled = run(FeatureType)
+print "  uncompiled %7.3f s" % baseline
+print "  compiled   %7.3f s  %5.2fx" % (compiled, baseline / compiled)
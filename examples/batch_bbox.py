@@ -9,7 +9,8 @@ native_bbox = \
 latlon_bbox = ['-103.877', '44.371', '-103.622', '44.5', 'EPSG:4326']
 
 sf = cat.get_workspace('sf')
-for rs in cat.get_resources(workspace=sf):
-    rs.native_bbox = native_bbox
-    rs.latlon_bbox = latlon_bbox
-    cat.save(rs)
+result = cat.bulk_update(cat.get_resources(workspace=sf),
+        native_bbox=native_bbox, latlon_bbox=latlon_bbox)
+print result
+for rs, error in result.failures:
+    print rs.name, error
@@ -0,0 +1,104 @@
+"""
+A non-blocking front end to the Catalog.
+
+Python 2 has no native event loop, so the AsyncCatalog runs catalog calls on
+a pool of worker threads and hands back a pending result immediately.  Each
+method returns a ``multiprocessing.pool.AsyncResult``: call ``get()`` on it to
+wait for the value (any exception raised by the request is re-raised there),
+or pass ``callback`` to be notified when the value arrives.  The objects
+produced are the usual ResourceInfo model classes, bound to the wrapped
+Catalog, so their properties still load synchronously on first access.  The
+listing methods take the Catalog's prefetch, fields and keep_dom options to
+load them in the background instead.
+"""
+
+from multiprocessing.pool import ThreadPool
+from geoserver.catalog import Catalog
+
+class AsyncCatalog(object):
+    def __init__(self, url, username="admin", password="geoserver",
+            transport=None, pool_size=10, cache=None, identity_map=False,
+            write_through=False, gzip_threshold=None):
+        self.catalog = Catalog(url, username, password, transport, pool_size,
+                cache, identity_map, write_through, gzip_threshold)
+        # one worker per pooled connection, so no worker waits on the transport
+        self._workers = ThreadPool(pool_size)
+
+    def _submit(self, method, args, kwargs, callback):
+        return self._workers.apply_async(method, args, kwargs, callback)
+
+    def close(self):
+        """Wait for pending requests to finish and stop the worker threads."""
+        self._workers.close()
+        self._workers.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_xml(self, url, callback=None):
+        return self._submit(self.catalog.get_xml, (url,), {}, callback)
+
+    def save(self, obj, force=False, callback=None):
+        return self._submit(self.catalog.save, (obj,), dict(force=force), callback)
+
+    def delete(self, obj, purge=False, callback=None):
+        return self._submit(self.catalog.delete, (obj,), dict(purge=purge), callback)
+
+    def get_workspaces(self, callback=None):
+        return self._submit(self.catalog.get_workspaces, (), {}, callback)
+
+    def get_workspace(self, name, callback=None):
+        return self._submit(self.catalog.get_workspace, (name,), {}, callback)
+
+    def get_stores(self, workspace=None, callback=None, **kwargs):
+        return self._submit(self.catalog.get_stores, (workspace,), kwargs, callback)
+
+    def get_store(self, name, workspace=None, callback=None):
+        return self._submit(self.catalog.get_store, (name, workspace), {}, callback)
+
+    def get_resources(self, store=None, workspace=None, callback=None, **kwargs):
+        return self._submit(self.catalog.get_resources, (store, workspace),
+                kwargs, callback)
+
+    def get_resource(self, name, store=None, workspace=None, callback=None):
+        return self._submit(self.catalog.get_resource,
+                (name, store, workspace), {}, callback)
+
+    def get_layers(self, resource=None, style=None, callback=None, **kwargs):
+        return self._submit(self.catalog.get_layers, (resource, style), kwargs,
+                callback)
+
+    def get_layer(self, name, callback=None):
+        return self._submit(self.catalog.get_layer, (name,), {}, callback)
+
+    def get_layergroups(self, callback=None, **kwargs):
+        return self._submit(self.catalog.get_layergroups, (), kwargs, callback)
+
+    def get_styles(self, callback=None):
+        return self._submit(self.catalog.get_styles, (), {}, callback)
+
+    def get_style(self, name, callback=None):
+        return self._submit(self.catalog.get_style, (name,), {}, callback)
+
+    def create_style(self, name, data, overwrite=False, callback=None):
+        return self._submit(self.catalog.create_style,
+                (name, data), dict(overwrite=overwrite), callback)
+
+    def create_featurestore(self, name, data, workspace=None, overwrite=False,
+            charset=None, callback=None):
+        return self._submit(self.catalog.create_featurestore, (name, data),
+                dict(workspace=workspace, overwrite=overwrite, charset=charset),
+                callback)
+
+    def create_coveragestore(self, name, data, workspace=None, overwrite=False,
+            callback=None):
+        return self._submit(self.catalog.create_coveragestore, (name, data),
+                dict(workspace=workspace, overwrite=overwrite), callback)
+
+    def add_data_to_store(self, store, name, data, overwrite=False,
+            charset=None, callback=None):
+        return self._submit(self.catalog.add_data_to_store, (store, name, data),
+                dict(overwrite=overwrite, charset=charset), callback)
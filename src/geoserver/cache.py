@@ -0,0 +1,434 @@
+"""
+Caching of REST responses for the Catalog.
+
+Documents fetched with Catalog.get_xml are kept in a ResponseCache, a
+least-recently-used map bounded both by number of entries and by total body
+size.  How long an entry may be served without asking GeoServer again is
+decided by a CachePolicy; once that time has passed the entry is kept and
+revalidated with a conditional GET rather than fetched from scratch.
+
+With ``keep_parsed`` the cache also holds on to the parsed element tree of
+each document, so repeated reads skip parsing entirely.  Those trees are
+shared by every caller and are therefore read-only; use thaw() to get a
+private, mutable copy.
+
+SQLiteCache adds a persistent tier, so a new process starts with the
+documents (and validators) its predecessors fetched.
+"""
+
+from collections import OrderedDict
+from threading import Event, Lock, RLock, local
+from time import time
+import os
+import sqlite3
+import sys
+from xml.etree.ElementTree import Element, TreeBuilder, XML, XMLParser
+import re
+
+class _ReadOnlyDict(dict):
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("cached documents are read-only; use thaw() for a mutable copy")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = \
+            _read_only
+
+class FrozenElement(Element):
+    """
+    An Element that refuses modification once sealed.  Trees are built
+    normally and sealed by parse_frozen() after parsing completes.
+    """
+
+    _sealed = False
+
+    def _check(self):
+        if self._sealed:
+            raise TypeError("cached documents are read-only; use thaw() for a mutable copy")
+
+    def __setattr__(self, name, value):
+        self._check()
+        Element.__setattr__(self, name, value)
+
+    def __setitem__(self, index, element):
+        self._check()
+        Element.__setitem__(self, index, element)
+
+    def __delitem__(self, index):
+        self._check()
+        Element.__delitem__(self, index)
+
+    def __setslice__(self, start, stop, elements):
+        self._check()
+        Element.__setslice__(self, start, stop, elements)
+
+    def __delslice__(self, start, stop):
+        self._check()
+        Element.__delslice__(self, start, stop)
+
+    def append(self, element):
+        self._check()
+        Element.append(self, element)
+
+    def extend(self, elements):
+        self._check()
+        Element.extend(self, elements)
+
+    def insert(self, index, element):
+        self._check()
+        Element.insert(self, index, element)
+
+    def remove(self, element):
+        self._check()
+        Element.remove(self, element)
+
+    def clear(self):
+        self._check()
+        Element.clear(self)
+
+    def set(self, key, value):
+        self._check()
+        Element.set(self, key, value)
+
+def parse_frozen(text):
+    """Parse text into a tree of sealed FrozenElements."""
+    parser = XMLParser(target=TreeBuilder(element_factory=FrozenElement))
+    parser.feed(text)
+    root = parser.close()
+    for node in root.iter():
+        node.attrib = _ReadOnlyDict(node.attrib)
+        node._sealed = True
+    return root
+
+def thaw(node):
+    """A deep, mutable copy of a (possibly frozen) element tree."""
+    copy = Element(node.tag, dict(node.attrib))
+    copy.text = node.text
+    copy.tail = node.tail
+    copy.extend(thaw(child) for child in node)
+    return copy
+
+class _Call(object):
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls for the same key.  While one call for a key is
+    running, other callers asking for that key wait for it and share its
+    result, or its exception, instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = dict()
+
+    def do(self, key, function, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error[0], call.error[1], call.error[2]
+            return call.result
+
+        try:
+            call.result = function(*args)
+        except:
+            call.error = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+class CacheEntry(object):
+    """A cached response body, along with its validators and expiry time."""
+
+    def __init__(self, content, ttl, etag=None, last_modified=None, status=200,
+            path=None):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.status = status
+        # the REST path of the document, for stores that evict by path
+        self.path = path
+        self.tree = None
+        self.renew(ttl)
+
+    def document(self, keep_parsed=False):
+        """
+        The parsed document.  With keep_parsed, the frozen tree is parsed once
+        and reused by later calls.
+        """
+        if self.tree is not None:
+            return self.tree
+        elif keep_parsed:
+            self.tree = parse_frozen(self.content)
+            return self.tree
+        else:
+            return XML(self.content)
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    def renew(self, ttl):
+        self.expires = time() + ttl
+
+    def is_fresh(self):
+        return time() < self.expires
+
+class CachePolicy(object):
+    """
+    Chooses the time-to-live for cached documents by REST path.  ``rules`` is
+    a sequence of (regular expression, seconds) pairs; the first expression
+    matching the start of the document's path relative to the service url
+    (for example ``/styles/point`` for ``.../rest/styles/point.xml``) wins.
+    Paths matching no rule use ``default``.  Lookups that found nothing (404
+    responses) are remembered for ``not_found`` seconds, regardless of path.
+
+    For example, to keep styles and workspaces for five minutes and layers
+    for ten seconds::
+
+        CachePolicy([
+            (r"/styles", 300),
+            (r"/workspaces/?[^/]*$", 300),
+            (r"/layers", 10)
+        ])
+    """
+
+    def __init__(self, rules=(), default=5, not_found=5):
+        self.rules = [(re.compile(pattern), ttl) for pattern, ttl in rules]
+        self.default = default
+        self.not_found = not_found
+
+    def ttl(self, path):
+        if path is not None:
+            for pattern, ttl in self.rules:
+                if pattern.match(path):
+                    return ttl
+        return self.default
+
+class ResponseCache(object):
+    """
+    A thread-safe LRU cache of CacheEntry objects keyed by URL.  Least
+    recently used entries are evicted whenever there are more than
+    ``max_entries`` of them or their bodies add up to more than ``max_bytes``.
+    Parsed trees kept with ``keep_parsed`` are not counted towards
+    ``max_bytes``; they typically take several times the size of the body.
+    """
+
+    def __init__(self, max_entries=2048, max_bytes=64 * 1024 * 1024, policy=None,
+            keep_parsed=False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy if policy is not None else CachePolicy()
+        self.keep_parsed = keep_parsed
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = RLock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def get(self, url):
+        """
+        Look up the entry for url, fresh or not, marking it as recently used.
+        Returns None if there is no entry.
+        """
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is not None:
+                self._entries[url] = entry
+        if entry is None:
+            entry = self._load(url)
+            if entry is not None:
+                self._insert(url, entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            elif entry.is_fresh():
+                self.hits += 1
+            else:
+                self.stale += 1
+        return entry
+
+    def put(self, url, entry):
+        self._insert(url, entry)
+        self._store(url, entry)
+
+    def _insert(self, url, entry):
+        with self._lock:
+            self._remove(url)
+            self._entries[url] = entry
+            self._bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries
+                    or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, url):
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def discard(self, url):
+        with self._lock:
+            self._remove(url)
+        self._delete_url(url)
+
+    def discard_paths(self, exact, prefixes, path_of, missing=()):
+        """
+        Remove every entry whose REST path is in exact or starts with one of
+        prefixes, and every cached miss (404) whose path starts with one of
+        missing.  path_of gives the path of a URL; entries it gives None for
+        are removed as well, since nothing is known about them.
+        """
+        def matches(url, entry):
+            path = path_of(url)
+            return path is None or path in exact or \
+                    any(path.startswith(p) for p in prefixes) or \
+                    (entry.status == 404 and
+                        any(path.startswith(p) for p in missing))
+        with self._lock:
+            for url in [u for u, e in self._entries.items() if matches(u, e)]:
+                self._remove(url)
+        self._delete_paths(exact, prefixes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        self._delete_all()
+
+    # Hooks for a slower, larger storage tier behind the in-memory entries.
+    # Entries evicted from memory stay in that tier.
+
+    def _load(self, url):
+        return None
+
+    def _store(self, url, entry):
+        pass
+
+    def _delete_all(self):
+        pass
+
+    def _delete_url(self, url):
+        pass
+
+    def _delete_paths(self, exact, prefixes):
+        pass
+
+    def stats(self):
+        """Counters for tuning the cache size and policy."""
+        with self._lock:
+            return dict(
+                entries=len(self._entries),
+                bytes=self._bytes,
+                hits=self.hits,
+                misses=self.misses,
+                stale=self.stale,
+                evictions=self.evictions)
+
+def _successor(prefix):
+    """The least string greater than every string starting with prefix."""
+    last = ord(prefix[-1]) + 1
+    return prefix[:-1] + (unichr(last) if isinstance(prefix, unicode) else chr(last))
+
+class SQLiteCache(ResponseCache):
+    """
+    A ResponseCache backed by an SQLite database in ``directory``, so cached
+    documents survive restarts.  The database runs in WAL mode and may be
+    shared by several processes on the same host.  Entries loaded from disk
+    keep their original expiry time, so after a restart they are usually
+    revalidated with a cheap conditional GET instead of downloaded again.
+    """
+
+    filename = "gsconfig-cache.sqlite"
+
+    def __init__(self, directory, timeout=30, **kwargs):
+        super(SQLiteCache, self).__init__(**kwargs)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = os.path.join(directory, self.filename)
+        self.timeout = timeout
+        # sqlite3 connections can't be shared between threads
+        self._local = local()
+        self._connection()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.text_factory = str
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "url TEXT PRIMARY KEY, content BLOB, etag TEXT, "
+                    "last_modified TEXT, expires REAL, stored REAL, path TEXT)")
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS responses_path ON responses (path)")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, url):
+        row = self._connection().execute(
+                "SELECT content, etag, last_modified, expires, path "
+                "FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        content, etag, last_modified, expires, path = row
+        entry = CacheEntry(str(content), 0, etag, last_modified, path=path)
+        entry.expires = expires
+        return entry
+
+    def _store(self, url, entry):
+        if entry.status != 200:
+            # negative entries are too short-lived to be worth persisting
+            return
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (url, content, etag, "
+                "last_modified, expires, stored, path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, buffer(entry.content), entry.etag, entry.last_modified,
+                    entry.expires, time(), entry.path))
+
+    def _delete_all(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def _delete_url(self, url):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+
+    def _delete_paths(self, exact, prefixes):
+        # every query is a lookup or range scan on the path index, so a
+        # write costs the same however large the database has grown
+        with self._connection() as conn:
+            conn.execute("DELETE FROM responses WHERE path IS NULL")
+            conn.executemany("DELETE FROM responses WHERE path = ?",
+                    [(path,) for path in exact])
+            conn.executemany(
+                    "DELETE FROM responses WHERE path >= ? AND path < ?",
+                    [(prefix, _successor(prefix)) for prefix in prefixes])
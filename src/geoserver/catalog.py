@@ -1,24 +1,38 @@
-from datetime import datetime, timedelta
 import logging
+from geoserver.cache import CacheEntry, ResponseCache, SingleFlight, thaw
 from geoserver.layer import Layer
+from geoserver.layerindex import LayerIndex
 from geoserver.store import coveragestore_from_index, datastore_from_index, \
     DataStore, CoverageStore, UnsavedDataStore, UnsavedCoverageStore
 from geoserver.resource import FeatureType
 from geoserver.style import Style
-from geoserver.support import prepare_upload_bundle
+from geoserver.support import ResourceInfo, index_entries, \
+    parallel_map, prepare_upload_bundle
 from geoserver.layergroup import LayerGroup, UnsavedLayerGroup
+from geoserver.transport import PooledTransport
 from geoserver.workspace import workspace_from_index, Workspace
+from cStringIO import StringIO
 from os import unlink
-import httplib2
+from threading import Lock, local
+from time import time
+from weakref import WeakValueDictionary, ref
 from zipfile import is_zipfile
-from xml.etree.ElementTree import XML
+from xml.etree.ElementTree import XML, iterparse, tostring
 from xml.parsers.expat import ExpatError
 
-from urlparse import urlparse
 from urllib import urlencode
+from urlparse import parse_qs, urlsplit
 
 logger = logging.getLogger("gsconfig.catalog")
 
+# suffixes GeoServer accepts on REST paths; they select a representation of
+# the same resource, so they are ignored when matching cache entries
+_REST_EXTENSIONS = set(["xml", "json", "html", "sld", "zip", "shp",
+    "geotiff", "worldimage", "imagemosaic"])
+
+# collections whose contents show up in the layer listing
+_LAYER_SOURCES = set(["datastores", "coveragestores", "featuretypes", "coverages"])
+
 class UploadError(Exception):
     pass
 
@@ -34,6 +48,114 @@ class FailedRequestError(Exception):
 class InvalidAttributesError(Exception):
     pass
 
+def _maybe_link(node):
+    link = node.find("{http://www.w3.org/2005/Atom}link")
+    return link.get("href") if link is not None else None
+
+def _merge(dom, update):
+    """
+    A copy of dom with each child of update in place of dom's first child
+    with the same tag, or appended if there is none.
+    """
+    merged = thaw(dom)
+    for node in update:
+        children = list(merged)
+        for i, child in enumerate(children):
+            if child.tag == node.tag:
+                merged[i] = thaw(node)
+                break
+        else:
+            merged.append(thaw(node))
+    return merged
+
+class _PathRef(ref):
+    __slots__ = ("path",)
+
+class _PathIndex(object):
+    """
+    Weak references to live objects, arranged in a tree by REST path so that
+    a write finds the objects it made stale without looking at any others.
+    Each node is a dict from path segment to child node; the object at a
+    path is held in its parent node under the key (None, segment), so the
+    many objects without children don't cost a node of their own.  Callers
+    lock around it.
+    """
+
+    def __init__(self):
+        self._root = dict()
+        # paths of collected objects; weakref callbacks may run in the middle
+        # of another operation, so they only note the path for add() to tidy
+        self._dead = []
+        self._collected = lambda r: self._dead.append(r.path)
+
+    def add(self, path, obj):
+        while self._dead:
+            self._remove(self._dead.pop())
+        segments = path.strip("/").split("/")
+        node = self._root
+        for segment in segments[:-1]:
+            node = node.setdefault(segment, dict())
+        r = _PathRef(obj, self._collected)
+        r.path = path
+        node[None, segments[-1]] = r
+
+    def _remove(self, path):
+        segments = path.strip("/").split("/")
+        nodes = [self._root]
+        for segment in segments[:-1]:
+            node = nodes[-1].get(segment)
+            if node is None:
+                return
+            nodes.append(node)
+        key = (None, segments[-1])
+        r = nodes[-1].get(key)
+        if r is not None and r() is None:
+            del nodes[-1][key]
+        # prune the branch back to the nearest node still in use
+        for parent, segment, node in reversed(zip(nodes, segments, nodes[1:])):
+            if node:
+                break
+            del parent[segment]
+
+    def _parent(self, segments):
+        node = self._root
+        for segment in segments:
+            node = node.get(segment)
+            if node is None:
+                break
+        return node
+
+    def _below(self, node):
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            for key, value in node.items():
+                if type(key) is tuple:
+                    yield value()
+                else:
+                    pending.append(value)
+
+    def find(self, exact, prefixes):
+        """
+        The live objects whose paths are in exact or start with one of
+        prefixes, each of which ends with "/".
+        """
+        found = []
+        for path in exact:
+            segments = path.strip("/").split("/")
+            node = self._parent(segments[:-1])
+            r = node.get((None, segments[-1])) if node is not None else None
+            if r is not None:
+                found.append(r())
+        for prefix in prefixes:
+            node = self._parent(prefix.strip("/").split("/"))
+            if node is not None:
+                found.extend(self._below(node))
+        return dict((id(obj), obj) for obj in found if obj is not None).values()
+
+    def values(self):
+        return [obj for obj in self._below(self._root) if obj is not None]
+
 class Catalog(object):
   """
   The GeoServer catalog represents all of the information in the GeoServer
@@ -49,26 +171,52 @@ class Catalog(object):
   - Namespaces, which provide unique identifiers for resources
   """
 
-  def __init__(self, url, username="admin", password="geoserver"):
+  def __init__(self, url, username="admin", password="geoserver",
+          transport=None, pool_size=4, cache=None, identity_map=False,
+          write_through=False, gzip_threshold=None):
+    """
+    Connect to the GeoServer REST API at ``url``.
+
+    A single Catalog may be shared between threads.  Requests go through
+    ``transport`` (see geoserver.transport); by default a PooledTransport
+    keeping up to ``pool_size`` keep-alive connections open to the server,
+    and gzipping request bodies of ``gzip_threshold`` bytes or more if that
+    is set.
+    Responses are kept in ``cache``, a geoserver.cache.ResponseCache; pass
+    one to change its size limits or expiry policy.
+
+    With ``identity_map``, the catalog hands out at most one live object per
+    href: listing or looking up something that is already in use returns
+    that same object, along with whatever it has already fetched.  When a
+    write through the catalog makes an object's document stale, the object
+    forgets it and fetches it again on next use, so every holder sees the
+    change.
+
+    With ``write_through``, saving a fetched object merges the values it
+    sent into its document, and into the cached copy, instead of leaving a
+    stale document behind; reading it back costs no request.  The merged
+    copy stands in for GeoServer's until the cache policy expires it, so
+    don't use this if GeoServer rewrites the values you save.
+    """
     self.service_url = url
     if self.service_url.endswith("/"):
         self.service_url = self.service_url.strip("/")
-    self.http = httplib2.Http()
     self.username = username
     self.password = password
-    self.http.add_credentials(self.username, self.password)
-    netloc = urlparse(url).netloc
-    self.http.authorizations.append(
-        httplib2.BasicAuthentication(
-            (username, password),
-            netloc,
-            url,
-            {},
-            None,
-            None,
-            self.http
-            ))
-    self._cache = dict()
+    self.pool_size = pool_size
+    if transport is None:
+        transport = PooledTransport(username, password, pool_size,
+                gzip_threshold=gzip_threshold)
+    self.http = transport
+    self._cache = cache if cache is not None else ResponseCache()
+    self._flights = SingleFlight()
+    self._layer_index = None
+    self.identity_map = identity_map
+    self.write_through = write_through
+    self._stubs = WeakValueDictionary()
+    self._stub_paths = _PathIndex()
+    self._stubs_lock = Lock()
+    self._deferred = local()
 
   def add(self, object):
     raise NotImplementedError()
@@ -91,49 +239,275 @@ class Catalog(object):
       "Accept": "application/xml"
     }
     response, content = self.http.request(url, "DELETE", headers=headers)
-    self._cache.clear()
+    self._invalidate(url, "DELETE")
 
     if response.status == 200:
         return (response, content)
     else:
         raise FailedRequestError("Tried to make a DELETE request to %s but got a %d status code: \n%s" % (url, response.status, content))
 
+  def _cache_path(self, url):
+    """
+    The REST path of url relative to the service url, without its query
+    string or format extension; None if url is not under the service url.
+    """
+    if url.startswith(self.service_url + "/") and "?" not in url and "#" not in url:
+        # the hrefs of model objects, which are built from the service url;
+        # this runs for every object the identity map registers
+        path = url[len(self.service_url):].strip("/")
+    else:
+        path = urlsplit(url).path
+        root = urlsplit(self.service_url).path
+        if not path.startswith(root):
+            return None
+        path = path[len(root):].strip("/")
+    head, dot, ext = path.rpartition(".")
+    if dot and "/" not in ext and ext in _REST_EXTENSIONS:
+        path = head
+    return "/" + path
+
+  def _invalidate(self, url, method):
+    """
+    Evict the cached documents that a write to url may have changed: the
+    written resource and everything below it, the listing containing it, and
+    listings that mirror it (for example layers.xml when a store or resource
+    changes).  Unrelated entries stay cached.  While a Session is sending
+    its writes, they are collected and evicted together after each rank.
+    """
+    batch = getattr(self._deferred, "batch", None)
+    if batch is not None:
+        batch.writes.append((url, method))
+    else:
+        self._evict([(url, method)])
+
+  def _after_invalidation(self, function, *args):
+    """Call function once the current write has been invalidated."""
+    batch = getattr(self._deferred, "batch", None)
+    if batch is not None:
+        batch.after.append((function, args))
+    else:
+        function(*args)
+
+  def _evict(self, writes):
+    """Invalidate the (url, method) writes, in a single pass over the cache."""
+    exact = set()
+    prefixes = set()
+    missing = set()
+    everything = False
+    reset_index = False
+    for url, method in writes:
+        path = self._cache_path(url)
+        if path is None:
+            everything = True
+            continue
+
+        segments = path.strip("/").split("/")
+        upload = segments[-1] == "file"
+        if upload:
+            # uploads address the store they write into
+            segments = segments[:-1]
+        elif len(segments) % 2 == 1:
+            # REST paths alternate collection/member; a POST to a collection
+            # with ?name= creates that member
+            name = parse_qs(urlsplit(url).query).get("name")
+            if name:
+                segments.append(name[0])
+
+        target = "/" + "/".join(segments)
+        parent = "/" + "/".join(segments[:-1])
+        exact.add(target)
+        prefixes.add(target + "/")
+        if len(segments) > 1:
+            exact.add(parent)
+        if segments[0] in ("workspaces", "namespaces") and len(segments) <= 2:
+            # every workspace has a namespace of the same name
+            for collection in ("workspaces", "namespaces"):
+                exact.add("/" + collection)
+                if len(segments) == 2:
+                    mirrored = "/%s/%s" % (collection, segments[1])
+                    exact.add(mirrored)
+                    prefixes.add(mirrored + "/")
+        layers = "/layers" in (target, parent)
+        if _LAYER_SOURCES.intersection(segments):
+            exact.add("/layers")
+            layers = True
+            if upload or method == "POST":
+                # the new layers' names aren't always in the url (an upload
+                # names them after the files it contains), so forget every
+                # layer lookup that came back empty
+                missing.add("/layers/")
+        if method == "DELETE":
+            # deletes cascade to the layers and groups that refer to the target
+            exact.update(["/layers", "/layergroups"])
+            prefixes.update(["/layers/", "/layergroups/"])
+            layers = True
+        if layers and (upload or method != "PUT"):
+            # layers may have been added or removed; saved layers are indexed
+            # by save() instead
+            reset_index = True
+
+    if everything:
+        self._cache.clear()
+    else:
+        self._cache.discard_paths(exact, prefixes, self._cache_path, missing)
+    with self._stubs_lock:
+        if everything:
+            stale = self._stub_paths.values()
+        else:
+            stale = self._stub_paths.find(exact, prefixes)
+    for obj in stale:
+        obj.expire()
+
+    if reset_index:
+        self._layer_index = None
+
+  def _shared(self, obj):
+    """
+    With identity_map, the object already handed out for obj's href, if one
+    is still in use; otherwise obj itself.  Objects carry unsaved changes,
+    so they are only shared when the caller asked for that.
+    """
+    if not self.identity_map:
+        return obj
+    href = obj.href
+    with self._stubs_lock:
+        shared = self._stubs.get(href)
+        if shared is None:
+            self._stubs[href] = shared = obj
+            # indexed by path too, so writes can expire it (see _evict)
+            self._stub_paths.add(self._cache_path(href), obj)
+        return shared
+
+  def cache_stats(self):
+    """
+    Hit, miss, revalidation (stale) and eviction counters for the response
+    cache, along with its current size.
+    """
+    return self._cache.stats()
+
+  def _get_entry(self, url):
+    cached = self._cache.get(url)
+    if cached is None or not cached.is_fresh():
+        # concurrent misses for the same url share a single request
+        cached = self._flights.do(url, self._fetch, url, cached)
+    if cached.status == 404:
+        raise FailedRequestError("Tried to make a GET request to %s but got a %d status code: \n%s" % (url, cached.status, cached.content))
+    return cached
+
   def get_xml(self, url):
     logger.debug("GET %s", url)
-    cached_response = self._cache.get(url)
-
-    def is_valid(cached_response):
-        return cached_response is not None and datetime.now() - cached_response[0] < timedelta(seconds=5)
+    entry = self._get_entry(url)
+    try:
+        return entry.document(self._cache.keep_parsed)
+    except (ExpatError, SyntaxError), e:
+        raise Exception(
+            "GeoServer gave non-XML response for [GET %s]: %s" % (
+                url, entry.content),
+            e)
+
+  def iter_xml(self, url, tag):
+    """
+    Yield the ``tag`` children of the document at url one at a time.  The
+    document is parsed incrementally and each child is discarded once the
+    caller moves on, so large listings are never held as a whole tree.
+    """
+    logger.debug("GET %s", url)
+    entry = self._get_entry(url)
+    if entry.tree is not None:
+        for node in entry.tree.findall(tag):
+            yield node
+        return
 
-    def parse_or_raise(xml):
-        try:
-            return XML(xml)
-        except (ExpatError, SyntaxError), e:
-            raise Exception(
-                "GeoServer gave non-XML response for [GET %s]: %s" % (
-                    url, xml),
-                e)
-
-    if is_valid(cached_response):
-            raw_text = cached_response[1]
-            return parse_or_raise(cached_response[1])
+    depth = 0
+    try:
+        for event, node in iterparse(StringIO(entry.content), ("start", "end")):
+            if event == "start":
+                if depth == 0:
+                    root = node
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1 and node.tag == tag:
+                yield node
+                root.clear()
+    except (ExpatError, SyntaxError), e:
+        raise Exception(
+            "GeoServer gave non-XML response for [GET %s]: %s" % (
+                url, entry.content),
+            e)
+
+  def get_index(self, url, tag):
+    """
+    The (name, href) pairs of the ``tag`` entries in the listing at url.
+    Most callers only need the names from a listing, and this reads them
+    without building an element tree, which is much faster on large
+    listings; see benchmarks/index_parsing.py.
+    """
+    logger.debug("GET %s", url)
+    entry = self._get_entry(url)
+    if entry.tree is not None:
+        return [(node.findtext("name"), _maybe_link(node))
+                for node in entry.tree.findall(tag)]
+    try:
+        return index_entries(entry.content, tag)
+    except ExpatError, e:
+        raise Exception(
+            "GeoServer gave non-XML response for [GET %s]: %s" % (
+                url, entry.content),
+            e)
+
+  def _fetch(self, url, cached):
+    # revalidate stale entries so an unchanged document costs a 304
+    headers = dict()
+    if cached is not None:
+        if cached.etag is not None:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified is not None:
+            headers["If-Modified-Since"] = cached.last_modified
+    response, content = self.http.request(url, headers=headers)
+    path = self._cache_path(url)
+    ttl = self._cache.policy.ttl(path)
+    if response.status == 304 and cached is not None:
+        logger.debug("%s not modified", url)
+        cached.renew(ttl)
+        self._cache.put(url, cached)
+        return cached
+    elif response.status == 200:
+        entry = CacheEntry(content, ttl,
+            response.get("etag"), response.get("last-modified"), path=path)
+        self._cache.put(url, entry)
+        return entry
+    elif response.status == 404:
+        # remember misses for a little while; creating or saving the resource
+        # evicts this entry along with any other stale ones
+        entry = CacheEntry(content, self._cache.policy.not_found, status=404,
+            path=path)
+        self._cache.put(url, entry)
+        return entry
     else:
-        response, content = self.http.request(url)
-        if response.status == 200:
-            self._cache[url] = (datetime.now(), content)
-            return parse_or_raise(content)
-        else:
-            raise FailedRequestError("Tried to make a GET request to %s but got a %d status code: \n%s" % (url, response.status, content))
+        raise FailedRequestError("Tried to make a GET request to %s but got a %d status code: \n%s" % (url, response.status, content))
 
-  def save(self, obj):
+  def save(self, obj, force=False):
     """
     saves an object to the REST service
 
     gets the object's REST location and the XML from the object,
     then POSTS the request.
+
+    If obj has been fetched and none of its changes differ from the fetched
+    document (say, a value was assigned the same value it already had), no
+    request is made at all.  Pass force=True to save regardless.  Returns
+    whether a request was made.
     """
     url = obj.href
     message = obj.message()
+    if not force and obj.save_method == "PUT" and not obj.changed():
+        logger.debug("skipping %s %s: nothing changed", obj.save_method, url)
+        if self.write_through:
+            obj.clear()
+        return False
+    # the document as it was before this save, for write-through
+    dom = obj.dom
 
     headers = {
       "Content-type": "application/xml",
@@ -141,59 +515,142 @@ class Catalog(object):
     }
     logger.debug("%s %s", obj.save_method, obj.href)
     headers, response = self.http.request(url, obj.save_method, message, headers)
-    self._cache.clear()
+    self._invalidate(url, obj.save_method)
     if headers.status < 200 or headers.status > 299: raise UploadError(response) 
 
+    if self.write_through:
+        self._after_invalidation(self._write_through, obj, url, dom, message)
+
+    index = self._layer_index
+    if index is not None and isinstance(obj, Layer):
+        index.update(obj)
+    return True
+
+  def _write_through(self, obj, url, dom, message):
+    """
+    Merge a successfully saved message into obj's document and the cache.
+    Objects that were never fetched, are new, or were renamed have no
+    document at url to merge into, and are left as they are.
+    """
+    if dom is None or obj.save_method != "PUT":
+        return
+    update = XML(message)
+    name = update.find("name")
+    if name is not None and name.text != dom.findtext("name"):
+        return
+    merged = _merge(dom, update)
+    path = self._cache_path(url)
+    self._cache.put(url, CacheEntry(tostring(merged),
+        self._cache.policy.ttl(path), path=path))
+    obj.dom = merged
+    obj._values = None
+    obj.clear()
+
+  def _lookup(self, obj):
+    """
+    Fetch obj directly from its own URL; False if GeoServer doesn't have it.
+    """
+    try:
+        obj.fetch()
+        return True
+    except FailedRequestError:
+        return False
+
   def get_store(self, name, workspace=None):
-      #stores = [s for s in self.get_stores(workspace) if s.name == name]
       if workspace is None:
-          store = None
-          for ws in self.get_workspaces():
-              found = None
+          def find(ws):
               try:
-                  found = self.get_store(name, ws)
-              except:
+                  return self.get_store(name, ws)
+              except FailedRequestError:
                   # don't expect every workspace to contain the named store
-                  pass
-              if found:
-                  if store:
-                      raise AmbiguousRequestError("Multiple stores found named: " + name)
-                  else:
-                      store = found
-
-          if not store:
+                  return None
+          found = [s for s in parallel_map(find, self.get_workspaces(), self.pool_size) if s]
+
+          if len(found) > 1:
+              raise AmbiguousRequestError("Multiple stores found named: " + name)
+          elif not found:
               raise FailedRequestError("No store found named: " + name)
-          return store
+          return found[0]
       else: # workspace is not None
-          logger.debug("datastore url is [%s]", workspace.datastore_url )
-          ds_list = self.get_xml(workspace.datastore_url)
-          cs_list = self.get_xml(workspace.coveragestore_url)
-          datastores = [n for n in ds_list.findall("dataStore") if n.find("name").text == name]
-          coveragestores = [n for n in cs_list.findall("coverageStore") if n.find("name").text == name]
-          ds_len, cs_len = len(datastores), len(coveragestores)
-
-          if ds_len == 1 and cs_len == 0:
-              return datastore_from_index(self, workspace, datastores[0])
-          elif ds_len == 0 and cs_len == 1:
-              return coveragestore_from_index(self, workspace, coveragestores[0])
-          elif ds_len == 0 and cs_len == 0:
+          candidates = [self._shared(DataStore(self, workspace, name)),
+                  self._shared(CoverageStore(self, workspace, name))]
+          found = [s for s in candidates if self._lookup(s)]
+
+          if len(found) == 1:
+              return found[0]
+          elif not found:
               raise FailedRequestError("No store found in " + str(workspace) + " named: " + name)
           else:
               raise AmbiguousRequestError(str(workspace) + " and name: " + name + " do not uniquely identify a layer")
 
-  def get_stores(self, workspace=None):
+  def get_stores(self, workspace=None, prefetch=False, fields=None,
+          keep_dom=True):
+      """
+      List the stores in workspace, or in every workspace.
+
+      Like the other listing methods, this returns unfetched objects unless
+      asked otherwise.  With prefetch=True their documents are fetched
+      concurrently before returning.  fields names properties to read in the
+      same pass (implying prefetch); dotted names such as
+      "resource.projection" also fetch the objects they pass through.
+      With keep_dom=False each object drops its document once the fields
+      have been read, keeping just their values (see ResourceInfo.compact),
+      or those of all its XML properties if no fields were named; this
+      saves a lot of memory when listing large catalogs.
+      """
       if workspace is not None:
-          ds_list = self.get_xml(workspace.datastore_url)
-          cs_list = self.get_xml(workspace.coveragestore_url)
-          datastores = [datastore_from_index(self, workspace, n) for n in ds_list.findall("dataStore")]
-          coveragestores = [coveragestore_from_index(self, workspace, n) for n in cs_list.findall("coverageStore")]
-          return datastores + coveragestores
+          ds_list = self.get_index(workspace.datastore_url, "dataStore")
+          cs_list = self.get_index(workspace.coveragestore_url, "coverageStore")
+          datastores = [self._shared(DataStore(self, workspace, name)) for name, href in ds_list]
+          coveragestores = [self._shared(CoverageStore(self, workspace, name)) for name, href in cs_list]
+          stores = datastores + coveragestores
       else:
           stores = []
           for ws in self.get_workspaces():
               a = self.get_stores(ws)
               stores.extend(a)
-          return stores
+      return self._prefetch(stores, prefetch, fields, keep_dom)
+
+  def _prefetch(self, objects, prefetch, fields, keep_dom=True):
+      """
+      Fetch objects, and anything reached through fields, up to pool_size at
+      a time.  See get_stores() for the meaning of the options.
+      """
+      if not (prefetch or fields):
+          return objects
+
+      def load(obj):
+          if obj.dom is None:
+              obj.fetch()
+          for field in fields or ():
+              value = obj
+              for attr in field.split("."):
+                  value = getattr(value, attr)
+                  if isinstance(value, ResourceInfo) and value.dom is None:
+                      value.fetch()
+          if not keep_dom:
+              # without fields, keep every value rather than none of them
+              obj.compact([f for f in fields or () if "." not in f] or None)
+
+      parallel_map(load, objects, self.pool_size)
+      return objects
+
+  def _iter_workspaces(self):
+      for node in self.iter_xml("%s/workspaces.xml" % self.service_url, "workspace"):
+          yield self._shared(workspace_from_index(self, node))
+
+  def iter_stores(self, workspace=None):
+      """
+      Like get_stores(), but yields each store as its workspace's listing is
+      read.  Listings of later workspaces aren't requested until the caller
+      gets that far, so stopping early skips them.
+      """
+      workspaces = [workspace] if workspace is not None else self._iter_workspaces()
+      for ws in workspaces:
+          for node in self.iter_xml(ws.datastore_url, "dataStore"):
+              yield self._shared(datastore_from_index(self, ws, node))
+          for node in self.iter_xml(ws.coveragestore_url, "coverageStore"):
+              yield self._shared(coveragestore_from_index(self, ws, node))
 
   def create_native_layer(self, workspace, store, name,
           native_name, title, srs, attributes):
@@ -277,7 +734,8 @@ class Catalog(object):
     url = '%s/workspaces/%s/datastores/%s/featuretypes?charset=UTF-8' % (self.service_url, ws.name, store)
     headers, response = self.http.request(url, "POST", xml, headers)
     assert 200 <= headers.status < 300, "Tried to create PostGIS Layer but got " + str(headers.status) + ": " + response
-    self._cache.clear()
+    self._invalidate("%s/workspaces/%s/datastores/%s/featuretypes/%s" % (
+        self.service_url, ws.name, ds.name, name), "POST")
     return self.get_resource(name, ds, ws)
 
 
@@ -324,7 +782,7 @@ class Catalog(object):
 
       try:
           headers, response = self.http.request(url, "PUT", message, headers)
-          self._cache.clear()
+          self._invalidate(url, "PUT")
           if headers.status != 201:
               raise UploadError(response)
       finally:
@@ -374,7 +832,7 @@ class Catalog(object):
     message = open(archive)
     try:
       headers, response = self.http.request(ds_url, "PUT", message, headers)
-      self._cache.clear()
+      self._invalidate(ds_url, "PUT")
       if headers.status != 201:
           raise UploadError(response)
     finally:
@@ -416,7 +874,7 @@ class Catalog(object):
     cs_url = "%s/workspaces/%s/coveragestores/%s/file.%s" % (self.service_url, workspace.name, name, ext)
     try:
       headers, response = self.http.request(cs_url, "PUT", message, headers)
-      self._cache.clear()
+      self._invalidate(cs_url, "PUT")
       if headers.status != 201:
           raise UploadError(response)
     finally:
@@ -428,7 +886,7 @@ class Catalog(object):
         if store.resource_type == "dataStore" and store.name != name:
             workspace = store.workspace
             try:
-                candidate = FeatureType(self, workspace, store, name)
+                candidate = self._shared(FeatureType(self, workspace, store, name))
                 candidate.title #throw FailedRequestError if not found
                 return candidate
             except FailedRequestError:
@@ -457,34 +915,121 @@ class Catalog(object):
         return resource
     return None
 
-  def get_resources(self, store=None, workspace=None, namespace=None):
+  def get_resources(self, store=None, workspace=None, namespace=None,
+          prefetch=False, fields=None, keep_dom=True):
     if store is not None:
-      return store.get_resources()
-    if workspace is not None:
+      resources = store.get_resources()
+    elif workspace is not None:
       resources = []
       for store in self.get_stores(workspace):
           resources.extend(self.get_resources(store))
-      return resources
-    resources = []
-    for ws in self.get_workspaces():
-      resources.extend(self.get_resources(workspace=ws))
-    return resources
+    else:
+      resources = []
+      for ws in self.get_workspaces():
+        resources.extend(self.get_resources(workspace=ws))
+    return self._prefetch(resources, prefetch, fields, keep_dom)
+
+  def iter_resources(self, store=None, workspace=None):
+    """
+    Like get_resources(), but yields each resource as its store's listing is
+    read; see iter_stores().
+    """
+    stores = [store] if store is not None else self.iter_stores(workspace)
+    for store in stores:
+        for resource in store.iter_resources():
+            yield resource
 
   def get_layer(self, name):
       try:
-          lyr = Layer(self, name)
+          lyr = self._shared(Layer(self, name))
           lyr.fetch()
           return lyr
       except FailedRequestError, e:
           return None
 
-  def get_layers(self, resource=None, style=None):
-    description = self.get_xml("%s/layers.xml" % self.service_url)
-    lyrs = [Layer(self, l.find("name").text) for l in description.findall("layer")]
+  def get_layers(self, resource=None, style=None, prefetch=False, fields=None,
+          keep_dom=True):
+    """
+    List layers, optionally only those publishing ``resource`` or using
+    ``style`` (a Style or style name).  Filtering goes through the layer
+    index; see get_layer_index().  For prefetch and fields, see get_stores().
+    """
+    if resource is None and style is None:
+      description = self.get_index("%s/layers.xml" % self.service_url, "layer")
+      lyrs = [self._shared(Layer(self, name)) for name, href in description]
+      return self._prefetch(lyrs, prefetch, fields, keep_dom)
+
+    index = self.get_layer_index()
+    names = None
     if resource is not None:
-      lyrs = [l for l in lyrs if l.resource.href == resource.href]
-    # TODO: Filter by style
-    return lyrs
+      names = set(index.layers_with_resource(resource))
+    if style is not None:
+      with_style = set(index.layers_with_style(style))
+      names = with_style if names is None else names & with_style
+    lyrs = [self._shared(Layer(self, name)) for name in sorted(names)]
+    return self._prefetch(lyrs, prefetch, fields, keep_dom)
+
+  def iter_layers(self):
+    """Like get_layers(), but yields layers while parsing the listing."""
+    for node in self.iter_xml("%s/layers.xml" % self.service_url, "layer"):
+      yield self._shared(Layer(self, node.find("name").text))
+
+  def get_layer_index(self, refresh=False):
+    """
+    The geoserver.layerindex.LayerIndex mapping styles and resources to the
+    layers using them.  It is built on first use by fetching every layer
+    concurrently, then kept current as layers are saved through this
+    catalog.  To pick up changes made elsewhere, it is rebuilt once it is
+    older than the cache policy's time-to-live for /layers, or when asked
+    with refresh=True.
+    """
+    index = self._layer_index
+    if index is None or refresh or \
+            time() - index.built >= self._cache.policy.ttl("/layers"):
+      index = self._layer_index = LayerIndex.build(self, self.pool_size)
+    return index
+
+  def session(self, workers=None):
+    """
+    Start a geoserver.session.Session, queueing writes to send together:
+
+        with catalog.session() as session:
+            for resource in resources:
+                resource.title = resource.title.strip()
+                session.save(resource)
+
+    Up to ``workers`` requests (by default the connection pool size) run at
+    a time when the block exits.
+    """
+    from geoserver.session import Session
+    return Session(self, workers or self.pool_size)
+
+  def bulk_update(self, objects, update=None, workers=None, **fields):
+    """
+    Change and save each of objects, up to ``workers`` at a time (by default
+    the connection pool size).  Every object gets the attribute values given
+    as keyword arguments, then, if given, is passed to ``update`` to make
+    changes of its own:
+
+        result = catalog.bulk_update(catalog.get_resources(workspace=sf),
+                latlon_bbox=bbox)
+
+    A failure to change or save one object doesn't stop the others.  Returns
+    a geoserver.session.BulkUpdate with the outcome for each object, the
+    failures and the throughput.  The cache is invalidated once, after every
+    save has been sent.
+    """
+    from geoserver.session import bulk_update
+    return bulk_update(self, objects, update, fields, workers or self.pool_size)
+
+  def snapshot(self, workers=None):
+    """
+    Crawl the whole catalog once and return a geoserver.snapshot.CatalogSnapshot
+    answering name and href lookups from memory.  Up to ``workers`` requests
+    (by default the connection pool size) run at a time.
+    """
+    from geoserver.snapshot import crawl
+    return crawl(self, workers or self.pool_size)
 
   def get_maps(self):
     raise NotImplementedError()
@@ -496,17 +1041,18 @@ class Catalog(object):
       try: 
           group = self.get_xml("%s/layergroups/%s.xml" % (
               self.service_url, name))
-          return LayerGroup(self, group.find("name").text)
+          return self._shared(LayerGroup(self, group.find("name").text))
       except FailedRequestError, e:
           return None
 
-  def get_layergroups(self):
-    groups = self.get_xml("%s/layergroups.xml" % self.service_url)
-    return [LayerGroup(self, g.find("name").text) for g in groups.findall("layerGroup")]
+  def get_layergroups(self, prefetch=False, fields=None, keep_dom=True):
+    groups = self.get_index("%s/layergroups.xml" % self.service_url, "layerGroup")
+    groups = [self._shared(LayerGroup(self, name)) for name, href in groups]
+    return self._prefetch(groups, prefetch, fields, keep_dom)
 
   def create_layergroup(self, name, layers = (), styles = (), bounds = None):
-      if any(g.name == name for g in self.get_layergroups()):
-          raise ConflictingDataError("Workspace named %s already exists!" %
+      if self._lookup(LayerGroup(self, name)):
+          raise ConflictingDataError("LayerGroup named %s already exists!" %
                   name)
       else:
           return UnsavedLayerGroup(self, name, layers, styles, bounds)
@@ -514,13 +1060,13 @@ class Catalog(object):
   def get_style(self, name):
       try:
           dom = self.get_xml("%s/styles/%s.xml" % (self.service_url, name))
-          return Style(self, dom.find("name").text)
+          return self._shared(Style(self, dom.find("name").text))
       except FailedRequestError, e:
           return None
 
   def get_styles(self):
-    description = self.get_xml("%s/styles.xml" % self.service_url)
-    return [Style(self, s.find('name').text) for s in description.findall("style")]
+    description = self.get_index("%s/styles.xml" % self.service_url, "style")
+    return [self._shared(Style(self, name)) for name, href in description]
 
   def create_style(self, name, data, overwrite = False):
     if overwrite == False and self.get_style(name) is not None:
@@ -538,7 +1084,7 @@ class Catalog(object):
       style_url = "%s/styles?name=%s" % (self.service_url, name)
       headers, response = self.http.request(style_url, "POST", data, headers)
 
-    self._cache.clear()
+    self._invalidate(style_url, "PUT" if overwrite else "POST")
     if headers.status < 200 or headers.status > 299: raise UploadError(response)
 
   def get_namespace(self, id=None, prefix=None, uri=None):
@@ -560,21 +1106,16 @@ class Catalog(object):
 
     headers, response = self.http.request(workspace_url, "POST", xml, headers)
     assert 200 <= headers.status < 300, "Tried to create workspace but got " + str(headers.status) + ": " + response
-    self._cache.clear()
+    self._invalidate(workspace_url + name, "POST")
     return self.get_workspace(name)
 
   def get_workspaces(self):
-    description = self.get_xml("%s/workspaces.xml" % self.service_url)
-    return [workspace_from_index(self, node) for node in description.findall("workspace")]
+    description = self.get_index("%s/workspaces.xml" % self.service_url, "workspace")
+    return [self._shared(Workspace(self, name)) for name, href in description]
 
   def get_workspace(self, name):
-    candidates = filter(lambda x: x.name == name, self.get_workspaces())
-    if len(candidates) == 0:
-      return None
-    elif len(candidates) > 1:
-      raise AmbiguousRequestError()
-    else:
-      return candidates[0]
+    ws = self._shared(Workspace(self, name))
+    return ws if self._lookup(ws) else None
 
   def reassign_workspace(self, store, workspace):
     def _create_forcing_workspace(self, store, workspace):
@@ -586,7 +1127,7 @@ class Catalog(object):
     self.delete(store, purge=True)
 
   def get_default_workspace(self):
-      return Workspace(self, "default")
+      return self._shared(Workspace(self, "default"))
 
   def set_default_workspace(self):
     raise NotImplementedError()
@@ -2,8 +2,39 @@ from geoserver.support import ResourceInfo, atom_link, atom_link_xml, \
         xml_property, write_bool, write_string
 from geoserver.style import Style
 from geoserver.resource import FeatureType, Coverage 
+from geoserver.store import DataStore, CoverageStore
+from geoserver.workspace import Workspace
 
 from collections import namedtuple
+from urllib import unquote
+from urlparse import urlsplit
+import re
+
+_resource_path = re.compile(
+    r"/workspaces/([^/]+)/(datastores|coveragestores)/([^/]+)/"
+    r"(featuretypes|coverages)/([^/]+)\.xml$")
+
+def resource_from_index(catalog, node):
+    """
+    Build the resource a layer's <resource> element refers to.  The resource,
+    its store and workspace are all addressed by the element's atom:link, so
+    no requests are needed unless GeoServer left the link out.
+    """
+    link = node.find("{http://www.w3.org/2005/Atom}link")
+    match = None
+    if link is not None:
+        match = _resource_path.search(urlsplit(link.get("href")).path)
+    if match is None:
+        return catalog.get_resource(node.find("name").text)
+
+    ws_name, store_type, store_name, _, name = [unquote(g) for g in match.groups()]
+    workspace = catalog._shared(Workspace(catalog, ws_name))
+    if store_type == "datastores":
+        return catalog._shared(FeatureType(catalog, workspace,
+                catalog._shared(DataStore(catalog, workspace, store_name)), name))
+    else:
+        return catalog._shared(Coverage(catalog, workspace,
+                catalog._shared(CoverageStore(catalog, workspace, store_name)), name))
 
 class _attribution(object):
     def __init__(self, title, width, height):
@@ -62,6 +93,8 @@ def _write_alternate_styles(builder, styles):
 
 
 class Layer(ResourceInfo):
+    __slots__ = ()
+
     def __init__(self, catalog, name):
         super(Layer, self).__init__()
         self.catalog = catalog
@@ -78,19 +111,31 @@ class Layer(ResourceInfo):
     def resource(self):
         if self.dom is None: 
             self.fetch()
-        name = self.dom.find("resource/name").text
-        ds = self.get_store(self.store)
-        return self.catalog.get_resource(name, ds)
+        return resource_from_index(self.catalog, self.dom.find("resource"))
 
-    def _get_default_style(self):
+    def _style(self, name, validate):
+        if name is None:
+            return None
+        elif validate:
+            return self.catalog.get_style(name)
+        else:
+            return self.catalog._shared(Style(self.catalog, name))
+
+    def get_default_style(self, validate=False):
+        """
+        The layer's default Style.  Reading its name costs no requests; the
+        style itself is fetched on first access to any other property.  With
+        validate=True it is looked up right away, and None is returned if
+        GeoServer has no such style.
+        """
         if 'default_style' in self.dirty:
-            return self.dirty['default_style']
+            return self._style(self.dirty['default_style'], validate)
         if self.dom is None:
             self.fetch()
         name = self.dom.find("defaultStyle/name")
         # aborted data uploads can result in no default style
         if name is not None:
-            return self.catalog.get_style(name.text)
+            return self._style(name.text, validate)
         else:
             return None
 
@@ -99,19 +144,28 @@ class Layer(ResourceInfo):
             style = style.name
         self.dirty["default_style"] = style
 
-    def _get_alternate_styles(self):
+    def get_styles(self, validate=False):
+        """
+        The layer's alternate Styles, fetched lazily as for
+        get_default_style().  With validate=True each one is looked up right
+        away and those GeoServer doesn't have come back as None, whether
+        they were fetched or set but not yet saved.
+        """
         if "alternate_styles" in self.dirty:
-            return self.dirty["alternate_styles"]
+            styles = self.dirty["alternate_styles"]
+            if validate:
+                return [self._style(getattr(s, "name", s), True) for s in styles]
+            return styles
         if self.dom is None:
             self.fetch()
         styles = self.dom.findall("styles/style/name")
-        return [Style(self.catalog, s.text) for s in styles]
+        return [self._style(s.text, validate) for s in styles]
 
     def _set_alternate_styles(self, styles):
         self.dirty["alternate_styles"] = styles
 
-    default_style = property(_get_default_style, _set_default_style)
-    styles = property(_get_alternate_styles, _set_alternate_styles)
+    default_style = property(get_default_style, _set_default_style)
+    styles = property(get_styles, _set_alternate_styles)
 
     attribution_object = xml_property("attribution", _read_attribution)
     enabled = xml_property("enabled", lambda x: x.text == "true")
@@ -135,3 +189,9 @@ class Layer(ResourceInfo):
             default_style = _write_default_style,
             alternate_styles = _write_alternate_styles
             )
+
+    readers = dict(
+            default_style = lambda dom: dom.findtext("defaultStyle/name"),
+            alternate_styles = lambda dom:
+                [n.text for n in dom.findall("styles/style/name")]
+            )
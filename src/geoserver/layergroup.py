@@ -40,6 +40,7 @@ def _write_styles(builder, styles):
 class LayerGroup(ResourceInfo):
     resource_type = "layerGroup"
     save_method = "PUT"
+    __slots__ = ()
 
     """
     Represents a layer group in geoserver 
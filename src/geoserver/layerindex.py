@@ -0,0 +1,85 @@
+"""
+Reverse indexes from styles and resources to the layers that use them.
+
+GeoServer only records these references on the layers themselves, so
+answering "which layers use this style?" means reading every layer.  A
+LayerIndex reads them all once, concurrently, and the Catalog keeps it
+current as layers are saved through it.
+"""
+
+from threading import Lock
+from time import time
+from geoserver.layer import resource_from_index
+from geoserver.support import parallel_map
+
+def _name(obj):
+    return getattr(obj, "name", obj)
+
+def _references(layer):
+    """The style names and resource href a layer refers to."""
+    if layer.dom is None:
+        layer.fetch()
+
+    if "default_style" in layer.dirty:
+        styles = [layer.dirty["default_style"]]
+    else:
+        styles = [n.text for n in layer.dom.findall("defaultStyle/name")]
+    if "alternate_styles" in layer.dirty:
+        styles.extend(_name(s) for s in layer.dirty["alternate_styles"])
+    else:
+        styles.extend(n.text for n in layer.dom.findall("styles/style/name"))
+
+    node = layer.dom.find("resource")
+    resource = resource_from_index(layer.catalog, node).href if node is not None else None
+    return set(s for s in styles if s is not None), resource
+
+class LayerIndex(object):
+    def __init__(self):
+        # when the layers were read, so the catalog can tell when to re-read
+        self.built = time()
+        self._lock = Lock()
+        self._references = dict()
+        self._by_style = dict()
+        self._by_resource = dict()
+
+    @classmethod
+    def build(cls, catalog, workers):
+        """Index every layer in catalog, fetching up to workers at a time."""
+        layers = catalog.get_layers()
+        parallel_map(lambda l: l.fetch(), layers, workers)
+        index = cls()
+        for layer in layers:
+            index.update(layer)
+        return index
+
+    def update(self, layer):
+        """Record the current styles and resource of layer."""
+        styles, resource = _references(layer)
+        with self._lock:
+            self._remove(layer.name)
+            self._references[layer.name] = (styles, resource)
+            for style in styles:
+                self._by_style.setdefault(style, set()).add(layer.name)
+            if resource is not None:
+                self._by_resource.setdefault(resource, set()).add(layer.name)
+
+    def remove(self, name):
+        with self._lock:
+            self._remove(name)
+
+    def _remove(self, name):
+        styles, resource = self._references.pop(name, ((), None))
+        for style in styles:
+            self._by_style[style].discard(name)
+        if resource is not None:
+            self._by_resource[resource].discard(name)
+
+    def layers_with_style(self, style):
+        """Names of the layers using style (a Style or name) in any role."""
+        with self._lock:
+            return sorted(self._by_style.get(_name(style), ()))
+
+    def layers_with_resource(self, resource):
+        """Names of the layers publishing resource."""
+        with self._lock:
+            return sorted(self._by_resource.get(resource.href, ()))
@@ -47,6 +47,7 @@ def coverage_from_index(catalog, workspace, store, node):
 class FeatureType(ResourceInfo):
     resource_type = "featureType"
     save_method = "PUT"
+    __slots__ = ("workspace", "store")
 
     def __init__(self, catalog, workspace, store, name):
         super(FeatureType, self).__init__()
@@ -136,6 +137,8 @@ def coverage_dimension_xml(builder, dimension):
     builder.end("coverageDimension")
 
 class Coverage(ResourceInfo):
+    __slots__ = ("workspace", "store")
+
     def __init__(self, catalog, workspace, store, name):
         super(Coverage, self).__init__()
         self.catalog = catalog
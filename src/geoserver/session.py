@@ -0,0 +1,249 @@
+"""
+Batched writes to a catalog.
+
+Scripts that change many objects usually save them one at a time, each save
+waiting for its own round trip and evicting cached documents on its own.  A
+Session queues saves, deletes and creations instead, and sends them all when
+it is closed: concurrently, in an order that creates things before whatever
+depends on them, and with one cache invalidation per step of that order
+rather than one per request.
+"""
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from geoserver.layer import Layer
+from geoserver.layergroup import LayerGroup
+from geoserver.resource import Coverage, FeatureType
+from geoserver.store import CoverageStore, DataStore
+from geoserver.style import Style
+from geoserver.support import parallel_map
+from geoserver.workspace import Workspace
+
+logger = logging.getLogger("gsconfig.session")
+
+# Objects only depend on objects of a lower rank, so writes go out rank by
+# rank, and deletes in the reverse order.
+_RANKS = [
+    (Workspace, 0),
+    (DataStore, 1),
+    (CoverageStore, 1),
+    (Style, 1),
+    (FeatureType, 2),
+    (Coverage, 2),
+    (Layer, 3),
+    (LayerGroup, 4)
+]
+
+def _rank(obj):
+    for cls, rank in _RANKS:
+        if isinstance(obj, cls):
+            return rank
+    return len(_RANKS)
+
+class _Batch(object):
+    """
+    The writes made while a batch is being sent, collected to be invalidated
+    together, and the work waiting on that invalidation.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.writes = []
+        self.after = []
+
+    def send(self, request):
+        """Call request, deferring the invalidation of its writes."""
+        self.catalog._deferred.batch = self
+        try:
+            return request()
+        finally:
+            self.catalog._deferred.batch = None
+
+    def close(self):
+        """Evict the writes sent so far and run the work waiting on that."""
+        writes, after = self.writes, self.after
+        self.writes, self.after = [], []
+        if writes:
+            self.catalog._evict(writes)
+        for function, args in after:
+            function(*args)
+
+class Session(object):
+    """
+    A unit of work against a Catalog; see Catalog.session().  Its save,
+    delete and create methods take the same arguments as the Catalog's, but
+    only queue the request.  Saves of the same href are merged into a single
+    request, later changes winning, and deleting an object drops any queued
+    save of it.
+
+    Leaving the ``with`` block, or calling flush(), sends the queue, rank by
+    rank.  Each rank's writes are invalidated together before the next rank
+    is sent, since later ranks may read what earlier ones changed (creating
+    a layer looks up the store created before it).  If the block raises,
+    the queue is discarded and nothing is sent.  Should a request fail, no
+    later rank is sent, and the error is raised once the cache has been
+    invalidated for everything that was.
+    """
+
+    def __init__(self, catalog, workers):
+        self.catalog = catalog
+        self.workers = workers
+        self._lock = Lock()
+        self._clear()
+
+    def _clear(self):
+        self._saves = OrderedDict()
+        self._deletes = OrderedDict()
+        self._creates = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.flush()
+        else:
+            self.discard()
+
+    def __len__(self):
+        """The number of requests queued."""
+        return len(self._saves) + len(self._deletes) + len(self._creates)
+
+    def save(self, obj, force=False):
+        with self._lock:
+            objects, forced = self._saves.get(obj.href, ([], False))
+            if not any(o is obj for o in objects):
+                objects.append(obj)
+            self._saves[obj.href] = (objects, forced or force)
+
+    def delete(self, obj, purge=False):
+        with self._lock:
+            self._saves.pop(obj.href, None)
+            self._deletes[obj.href] = (obj, purge)
+
+    def _create(self, rank, method, *args, **kwargs):
+        with self._lock:
+            self._creates.append((rank, lambda: method(*args, **kwargs)))
+
+    def create_workspace(self, name, uri):
+        self._create(0, self.catalog.create_workspace, name, uri)
+
+    def create_style(self, name, data, overwrite=False):
+        self._create(1, self.catalog.create_style, name, data, overwrite)
+
+    def create_featurestore(self, name, data, workspace=None, overwrite=False,
+            charset=None):
+        self._create(1, self.catalog.create_featurestore, name, data,
+                workspace, overwrite, charset)
+
+    def create_coveragestore(self, name, data, workspace=None, overwrite=False):
+        self._create(1, self.catalog.create_coveragestore, name, data,
+                workspace, overwrite)
+
+    def add_data_to_store(self, store, name, data, overwrite=False,
+            charset=None):
+        self._create(2, self.catalog.add_data_to_store, store, name, data,
+                overwrite, charset)
+
+    def create_native_layer(self, workspace, store, name, native_name, title,
+            srs, attributes):
+        self._create(2, self.catalog.create_native_layer, workspace, store,
+                name, native_name, title, srs, attributes)
+
+    def discard(self):
+        """Forget everything queued."""
+        with self._lock:
+            self._clear()
+
+    def _save(self, objects, force):
+        obj = objects[0]
+        for other in objects[1:]:
+            obj.dirty.update(other.dirty)
+        self.catalog.save(obj, force)
+
+    def flush(self):
+        """Send everything queued, invalidating the cache after each rank."""
+        with self._lock:
+            saves, deletes, creates = self._saves, self._deletes, self._creates
+            self._clear()
+
+        writes = dict()
+        for rank, request in creates:
+            writes.setdefault(rank, []).append(request)
+        for objects, force in saves.values():
+            writes.setdefault(_rank(objects[0]), []).append(
+                    lambda objects=objects, force=force: self._save(objects, force))
+        removals = dict()
+        for obj, purge in deletes.values():
+            removals.setdefault(_rank(obj), []).append(
+                    lambda obj=obj, purge=purge: self.catalog.delete(obj, purge))
+        phases = [writes[r] for r in sorted(writes)] + \
+                [removals[r] for r in sorted(removals, reverse=True)]
+
+        batch = _Batch(self.catalog)
+        for requests in phases:
+            try:
+                parallel_map(batch.send, requests, self.workers)
+            finally:
+                batch.close()
+
+class BulkUpdate(object):
+    """
+    The outcome of Catalog.bulk_update().  ``results`` pairs each object with
+    True if it was saved, False if saving it would have changed nothing, or
+    the exception that stopped it.
+    """
+
+    def __init__(self, results, elapsed):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def saved(self):
+        return [obj for obj, outcome in self.results if outcome is True]
+
+    @property
+    def unchanged(self):
+        return [obj for obj, outcome in self.results if outcome is False]
+
+    @property
+    def failures(self):
+        """(object, exception) for each object that couldn't be updated."""
+        return [(obj, outcome) for obj, outcome in self.results
+                if isinstance(outcome, Exception)]
+
+    @property
+    def throughput(self):
+        """Objects processed per second."""
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return "<BulkUpdate: %d saved, %d unchanged, %d failed in %.1fs (%.1f/s)>" % (
+                len(self.saved), len(self.unchanged), len(self.failures),
+                self.elapsed, self.throughput)
+
+def bulk_update(catalog, objects, update, fields, workers):
+    """Carry out Catalog.bulk_update()."""
+    def apply(obj):
+        try:
+            for name, value in fields.items():
+                setattr(obj, name, value)
+            if update is not None:
+                update(obj)
+            return obj, catalog.save(obj)
+        except Exception, e:
+            logger.warning("updating %s failed: %s", obj.href, e)
+            return obj, e
+
+    batch = _Batch(catalog)
+    start = time()
+    try:
+        results = parallel_map(lambda obj: batch.send(lambda: apply(obj)),
+                objects, workers)
+    finally:
+        batch.close()
+    result = BulkUpdate(results, time() - start)
+    logger.info("%r", result)
+    return result
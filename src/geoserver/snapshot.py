@@ -0,0 +1,145 @@
+"""
+Point-in-time, indexed views of a whole catalog.
+
+Looking things up by name through the Catalog means walking the REST tree:
+get_store(name) lists the stores of every workspace and get_resource(name)
+lists the resources of every store.  A CatalogSnapshot crawls the tree once,
+with concurrent requests, and answers later lookups from in-memory indexes.
+It does not track changes made after it was taken; take a new one for that.
+"""
+
+from geoserver.catalog import AmbiguousRequestError, FailedRequestError
+from geoserver.layer import Layer
+from geoserver.layergroup import LayerGroup
+from geoserver.style import Style
+from geoserver.support import parallel_map
+from geoserver.workspace import Workspace
+
+def _name(obj):
+    return getattr(obj, "name", obj)
+
+def _index(objects, key):
+    index = dict()
+    for obj in objects:
+        index.setdefault(key(obj), []).append(obj)
+    return index
+
+def _unique(candidates, description):
+    if not candidates:
+        return None
+    elif len(candidates) > 1:
+        raise AmbiguousRequestError("Multiple %s" % description)
+    else:
+        return candidates[0]
+
+def crawl(catalog, workers):
+    """
+    Fetch every listing needed for a CatalogSnapshot of catalog, running up
+    to workers requests at a time.
+    """
+    url = catalog.service_url
+    workspaces, layers, groups, styles = parallel_map(
+        lambda (path, tag): catalog.get_index(url + path, tag), [
+            ("/workspaces.xml", "workspace"),
+            ("/layers.xml", "layer"),
+            ("/layergroups.xml", "layerGroup"),
+            ("/styles.xml", "style")
+        ], workers)
+
+    workspaces = [catalog._shared(Workspace(catalog, name)) for name, href in workspaces]
+    stores = sum(parallel_map(catalog.get_stores, workspaces, workers), [])
+    resources = sum(parallel_map(lambda s: s.get_resources(), stores, workers), [])
+    layers = [catalog._shared(Layer(catalog, name)) for name, href in layers]
+    groups = [catalog._shared(LayerGroup(catalog, name)) for name, href in groups]
+    styles = [catalog._shared(Style(catalog, name)) for name, href in styles]
+
+    return CatalogSnapshot(workspaces, stores, resources, layers, groups, styles)
+
+class CatalogSnapshot(object):
+    """
+    An immutable view of the catalog's workspaces, stores, resources, layers,
+    layer groups and styles, with constant-time lookups by name, by qualified
+    ``workspace:name`` and by href.  Lookup methods mirror those of the
+    Catalog; workspace and store arguments may be objects or names.
+    """
+
+    def __init__(self, workspaces, stores, resources, layers, layergroups, styles):
+        self.workspaces = tuple(workspaces)
+        self.stores = tuple(stores)
+        self.resources = tuple(resources)
+        self.layers = tuple(layers)
+        self.layergroups = tuple(layergroups)
+        self.styles = tuple(styles)
+
+        self._workspaces = _index(self.workspaces, _name)
+        self._stores = _index(self.stores, _name)
+        self._qualified_stores = _index(self.stores,
+                lambda s: "%s:%s" % (s.workspace.name, s.name))
+        self._resources = _index(self.resources, _name)
+        self._qualified_resources = _index(self.resources,
+                lambda r: "%s:%s" % (r.workspace.name, r.name))
+        self._store_resources = _index(self.resources,
+                lambda r: (r.store.href, r.name))
+        self._layers = _index(self.layers, _name)
+        self._layergroups = _index(self.layergroups, _name)
+        self._styles = _index(self.styles, _name)
+        self._hrefs = dict((obj.href, obj) for obj in
+                self.workspaces + self.stores + self.resources + self.layers +
+                self.layergroups + self.styles)
+
+    def __len__(self):
+        return len(self._hrefs)
+
+    def get(self, href):
+        """The object at href, or None if the snapshot has no such object."""
+        return self._hrefs.get(href)
+
+    def get_workspace(self, name):
+        return _unique(self._workspaces.get(name), "workspaces named " + name)
+
+    def get_store(self, name, workspace=None):
+        if workspace is None:
+            candidates = self._stores.get(name)
+            where = ""
+        else:
+            where = " in " + _name(workspace)
+            candidates = self._qualified_stores.get(
+                    "%s:%s" % (_name(workspace), name))
+        store = _unique(candidates, "stores named %s%s" % (name, where))
+        if store is None:
+            raise FailedRequestError("No store found%s named: %s" % (where, name))
+        return store
+
+    def _store(self, store, workspace):
+        if isinstance(store, basestring):
+            return self.get_store(store, workspace)
+        return store
+
+    def get_resource(self, name, store=None, workspace=None):
+        if store is not None:
+            store = self._store(store, workspace)
+            candidates = self._store_resources.get((store.href, name))
+        elif workspace is not None:
+            candidates = self._qualified_resources.get(
+                    "%s:%s" % (_name(workspace), name))
+        else:
+            candidates = self._resources.get(name)
+        return _unique(candidates, "resources named " + name)
+
+    def get_resources(self, store=None, workspace=None):
+        if store is not None:
+            store = self._store(store, workspace)
+            return [r for r in self.resources if r.store.href == store.href]
+        elif workspace is not None:
+            return [r for r in self.resources if r.workspace.name == _name(workspace)]
+        else:
+            return list(self.resources)
+
+    def get_layer(self, name):
+        return _unique(self._layers.get(name), "layers named " + name)
+
+    def get_layergroup(self, name):
+        return _unique(self._layergroups.get(name), "layer groups named " + name)
+
+    def get_style(self, name):
+        return _unique(self._styles.get(name), "styles named " + name)
@@ -1,7 +1,8 @@
 import geoserver.workspace as ws
-from geoserver.resource import featuretype_from_index, coverage_from_index
+from geoserver.resource import featuretype_from_index, coverage_from_index, \
+        FeatureType, Coverage
 from geoserver.support import ResourceInfo, atom_link, xml_property, key_value_pairs, \
-        write_bool, write_dict, write_string
+        write_bool, write_dict, write_string, _intern
 
 def datastore_from_index(catalog, workspace, node):
     name = node.find("name")
@@ -14,6 +15,7 @@ def coveragestore_from_index(catalog, workspace, node):
 class DataStore(ResourceInfo):
     resource_type = "dataStore"
     save_method = "PUT"
+    __slots__ = ("workspace",)
 
     def __init__(self, catalog, workspace, name):
         super(DataStore, self).__init__()
@@ -22,7 +24,7 @@ class DataStore(ResourceInfo):
         assert isinstance(name, basestring)
         self.catalog = catalog
         self.workspace = workspace
-        self.name = name
+        self.name = _intern(name)
 
     @property
     def href(self):
@@ -37,17 +39,23 @@ class DataStore(ResourceInfo):
                    connectionParameters = write_dict("connectionParameters"))
 
 
-    def get_resources(self):
-        res_url = "%s/workspaces/%s/datastores/%s/featuretypes.xml" % (
+    @property
+    def resource_url(self):
+        return "%s/workspaces/%s/datastores/%s/featuretypes.xml" % (
                    self.catalog.service_url,
                    self.workspace.name,
                    self.name
                 )
-        xml = self.catalog.get_xml(res_url)
-        def ft_from_node(node):
-            return featuretype_from_index(self.catalog, self.workspace, self, node)
 
-        return [ft_from_node(node) for node in xml.findall("featureType")]
+    def get_resources(self):
+        index = self.catalog.get_index(self.resource_url, "featureType")
+        return [self.catalog._shared(FeatureType(self.catalog, self.workspace, self, name))
+                for name, href in index]
+
+    def iter_resources(self):
+        for node in self.catalog.iter_xml(self.resource_url, "featureType"):
+            yield self.catalog._shared(
+                    featuretype_from_index(self.catalog, self.workspace, self, node))
 
 class UnsavedDataStore(DataStore):
     save_method = "POST"
@@ -64,6 +72,7 @@ class UnsavedDataStore(DataStore):
 class CoverageStore(ResourceInfo):
     resource_type = 'coverageStore'
     save_method = "PUT"
+    __slots__ = ("workspace",)
 
     def __init__(self, catalog, workspace, name):
         super(CoverageStore, self).__init__()
@@ -73,7 +82,7 @@ class CoverageStore(ResourceInfo):
 
         self.catalog = catalog
         self.workspace = workspace
-        self.name = name
+        self.name = _intern(name)
 
     @property
     def href(self):
@@ -90,20 +99,23 @@ class CoverageStore(ResourceInfo):
                    type = write_string("type"))
 
 
-    def get_resources(self):
-        res_url = "%s/workspaces/%s/coveragestores/%s/coverages.xml" % (
+    @property
+    def resource_url(self):
+        return "%s/workspaces/%s/coveragestores/%s/coverages.xml" % (
                   self.catalog.service_url,
                   self.workspace.name,
                   self.name
                 )
 
-        xml = self.catalog.get_xml(res_url)
-
-        def cov_from_node(node):
-            name = node.find("name")
-            return coverage_from_index(self.catalog, self.workspace, self, node)
-
-        return [cov_from_node(node) for node in xml.findall("coverage")]
+    def get_resources(self):
+        index = self.catalog.get_index(self.resource_url, "coverage")
+        return [self.catalog._shared(Coverage(self.catalog, self.workspace, self, name))
+                for name, href in index]
+
+    def iter_resources(self):
+        for node in self.catalog.iter_xml(self.resource_url, "coverage"):
+            yield self.catalog._shared(
+                    coverage_from_index(self.catalog, self.workspace, self, node))
 
 class UnsavedCoverageStore(CoverageStore):
     save_method = "POST"
@@ -2,6 +2,8 @@ from geoserver.support import ResourceInfo, atom_link, xml_property
 import re
 
 class Style(ResourceInfo):
+    __slots__ = ("_sld_dom",)
+
     def __init__(self, catalog, name):
         super(Style, self).__init__()
         assert isinstance(name, basestring)
@@ -19,6 +21,10 @@ class Style(ResourceInfo):
 
     filename = xml_property("filename")
 
+    def expire(self):
+        super(Style, self).expire()
+        self._sld_dom = None
+
     def _get_sld_dom(self):
         if self._sld_dom is None:
             self._sld_dom = self.catalog.get_xml(self.body_href())
@@ -1,5 +1,9 @@
 import logging
-from xml.etree.ElementTree import TreeBuilder, tostring
+import re
+from copy import copy
+from multiprocessing.pool import ThreadPool
+from xml.etree.ElementTree import TreeBuilder, iselement, tostring
+from xml.parsers import expat
 from tempfile import mkstemp
 from zipfile import ZipFile
 
@@ -27,15 +31,35 @@ information from the underlying storage mechanism to reproject to the
 configured projection.
 """
 
+class _XMLProperty(property):
+    # a property that knows which element it reads and how, so ResourceInfo
+    # can decode all of them at once
+    pass
+
+def _copy(value):
+    """
+    A copy of a decoded value that the caller may change without changing
+    the memoized original: lists and dicts are copied all the way down, and
+    so are plain objects such as a layer's attribution.  Strings, tuples and
+    elements of the document are returned as they are.
+    """
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    elif isinstance(value, dict):
+        return dict((k, _copy(v)) for k, v in value.iteritems())
+    elif hasattr(value, "__dict__") and not iselement(value):
+        return copy(value)
+    else:
+        return value
+
 def xml_property(path, converter = lambda x: x.text):
     def get(self):
         if path in self.dirty:
             return self.dirty[path]
-        else:
-            if self.dom is None:
-                self.fetch()
-            node = self.dom.find(path)
-            return converter(self.dom.find(path)) if node is not None else None
+        values = self._values
+        if values is None or path not in values:
+            values = self._decode()
+        return _copy(values[path])
 
     def set(self, value):
         self.dirty[path] = value
@@ -43,7 +67,31 @@ def xml_property(path, converter = lambda x: x.text):
     def delete(self):
         self.dirty[path] = None
 
-    return property(get, set, delete)
+    prop = _XMLProperty(get, set, delete)
+    prop.path = path
+    prop.converter = converter
+    return prop
+
+def _decoders(cls):
+    """
+    The (path, converter, simple) of every XML property of cls, computed once
+    per class.  simple paths name a child element of the document root.
+    """
+    table = cls.__dict__.get("_decoder_table")
+    if table is None:
+        converters = dict()
+        for klass in reversed(cls.__mro__):
+            for attr in vars(klass).values():
+                if isinstance(attr, _XMLProperty):
+                    converters[attr.path] = attr.converter
+        table = tuple((path, converter, not re.search(r"[/.\[{*]", path))
+                for path, converter in converters.items())
+        cls._decoder_table = table
+    return table
+
+def _intern(name):
+    # workspace and store names repeat across every object they contain
+    return intern(name) if type(name) is str else name
 
 def bbox(node):
     if node is not None: 
@@ -119,13 +167,119 @@ def write_dict(name):
         builder.end(name)
     return write
 
+def _comparable(value):
+    """
+    value in a form that compares equal to another value exactly when the
+    two would be saved the same way, whether they were assigned by the
+    caller or decoded from a document.
+    """
+    if value is None or isinstance(value, basestring):
+        return value
+    elif isinstance(value, bool):
+        return "true" if value else "false"
+    elif isinstance(value, dict):
+        return dict((k, _comparable(v)) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        return tuple(_comparable(v) for v in value)
+    elif iselement(value):
+        return value.text
+    elif isinstance(value, ResourceInfo):
+        return value.name
+    elif hasattr(value, "__dict__"):
+        return _comparable(vars(value))
+    else:
+        return str(value)
+
 class ResourceInfo(object):
+    # Catalogs can hold hundreds of thousands of these, so the model classes
+    # declare their attributes as slots.  The Unsaved* classes don't, and
+    # keep a __dict__ for ad hoc attributes.
+    __slots__ = ("catalog", "name", "dom", "dirty", "_values", "__weakref__")
+
     def __init__(self):
         self.dom = None
         self.dirty = dict()
+        self._values = None
 
     def fetch(self):
         self.dom = self.catalog.get_xml(self.href)
+        self._values = None
+
+    def _decode(self):
+        """
+        Convert every XML property of this object in one pass over its
+        document, fetching it first if need be.  The values are kept until
+        the next fetch(), so converters run once per document rather than on
+        every read; properties hand out copies of them.
+        """
+        if self.dom is None:
+            self.fetch()
+        values = self._convert(self.dom)
+        self._values = values
+        return values
+
+    def _convert(self, dom):
+        children = dict()
+        for node in reversed(dom):
+            children[node.tag] = node
+        values = dict()
+        for path, converter, simple in _decoders(type(self)):
+            node = children.get(path) if simple else dom.find(path)
+            values[path] = converter(node) if node is not None else None
+        return values
+
+    def expire(self):
+        """Forget the fetched document; the next read fetches it again."""
+        self.dom = None
+        self._values = None
+
+    def compact(self, fields=()):
+        """
+        Drop the fetched document, keeping only the values of the XML
+        properties named in fields, or of all of them if fields is None.
+        Reading any other property fetches the document again.
+        """
+        if self.dom is None:
+            return
+        if fields is None:
+            values = self._values if self._values is not None else self._decode()
+        else:
+            values = dict()
+            for field in fields:
+                prop = getattr(type(self), field, None)
+                if isinstance(prop, _XMLProperty):
+                    values[prop.path] = getattr(self, field)
+        self._values = values
+        self.dom = None
+
+    # functions reading the saved value of a dirty key from the document,
+    # for keys that aren't XML property paths
+    readers = dict()
+
+    def changed(self):
+        """
+        The dirty keys that would be saved with values different from those
+        in the fetched document.  Without a document, every key that would
+        be saved counts as changed.  The document is decoded afresh for the
+        comparison, so nothing a caller did to values read earlier can hide
+        a change.
+        """
+        keys = [k for k in self.dirty if k in self.writers]
+        dom = self.dom
+        if dom is None:
+            return keys
+        values = self._convert(dom)
+        changed = []
+        for key in keys:
+            if key in self.readers:
+                current = self.readers[key](dom)
+            elif key in values:
+                current = values[key]
+            else:
+                current = dom.findtext(key)
+            if _comparable(self.dirty[key]) != _comparable(current):
+                changed.append(key)
+        return changed
 
     def clear(self):
         self.dirty = dict()
@@ -152,6 +306,75 @@ class ResourceInfo(object):
         msg = tostring(builder.close())
         return msg
                 
+def parallel_map(function, items, workers):
+    """
+    Like map(), but runs up to ``workers`` calls at a time on a pool of
+    threads.  Results come back in the order of items; if any call raises,
+    the exception is re-raised once the other calls have finished.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return map(function, items)
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(function, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def _fixtext(text):
+    # match ElementTree, which hands back plain strings for ASCII text
+    if text is None:
+        return None
+    try:
+        return text.encode("ascii")
+    except UnicodeError:
+        return text
+
+class _IndexHandler(object):
+    def __init__(self, tag):
+        self.tag = tag
+        self.entries = []
+        self.depth = 0
+        self.name = self.href = self.text = None
+
+    def start(self, element, attrs):
+        self.depth += 1
+        if self.depth == 3:
+            if element == "name":
+                self.text = []
+            elif element.endswith("link") and "href" in attrs:
+                self.href = attrs["href"]
+
+    def end(self, element):
+        self.depth -= 1
+        if self.depth == 2 and self.text is not None:
+            self.name = u"".join(self.text)
+            self.text = None
+        elif self.depth == 1 and element == self.tag:
+            self.entries.append((_fixtext(self.name), _fixtext(self.href)))
+            self.name = self.href = None
+
+    def data(self, chars):
+        if self.text is not None:
+            self.text.append(chars)
+
+def index_entries(text, tag):
+    """
+    The (name, href) of each ``tag`` entry in a REST listing such as
+    layers.xml, read straight from the expat event stream without building
+    an element tree.  href is taken from the entry's atom:link and is None
+    if there isn't one.
+    """
+    handler = _IndexHandler(tag)
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.data
+    parser.Parse(text, True)
+    return handler.entries
+
 def prepare_upload_bundle(name, data):
     """GeoServer's REST API uses ZIP archives as containers for file formats such
     as Shapefile and WorldImage which include several 'boxcar' files alongside
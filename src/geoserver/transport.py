@@ -0,0 +1,141 @@
+"""
+HTTP transports used by the Catalog to talk to GeoServer's REST API.
+
+A transport is any object providing a ``request`` method with the same
+signature and return value as ``httplib2.Http.request``.  Unlike a bare
+``httplib2.Http`` instance, a transport must be safe to call from several
+threads at once.
+"""
+
+import logging
+from cStringIO import StringIO
+from gzip import GzipFile
+from Queue import Queue, Empty
+from threading import BoundedSemaphore, Lock
+from urlparse import urlparse
+import httplib2
+
+logger = logging.getLogger("gsconfig.transport")
+
+def _has_header(headers, name):
+    return any(k.lower() == name for k in headers)
+
+def _gzip(data):
+    buf = StringIO()
+    f = GzipFile(fileobj=buf, mode="wb")
+    f.write(data)
+    f.close()
+    return buf.getvalue()
+
+class Transport(object):
+    """
+    The interface the Catalog expects from its HTTP layer.  Subclass this to
+    plug in a different HTTP client.
+    """
+
+    def request(self, uri, method="GET", body=None, headers=None):
+        raise NotImplementedError()
+
+class _HostPool(object):
+    """
+    A bounded pool of ``httplib2.Http`` objects for a single host.  Each Http
+    object holds its own keep-alive connection, so the pool size is also the
+    maximum number of connections opened to the host.  Callers block in
+    acquire() while every connection is busy.
+    """
+
+    def __init__(self, factory, size):
+        self._factory = factory
+        self._idle = Queue()
+        self._slots = BoundedSemaphore(size)
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            try:
+                return self._factory()
+            except:
+                self._slots.release()
+                raise
+
+    def release(self, http, reuse=True):
+        if reuse:
+            self._idle.put(http)
+        self._slots.release()
+
+class PooledTransport(Transport):
+    """
+    A thread-safe transport keeping up to ``pool_size`` keep-alive connections
+    open per host.  Credentials, if given, are sent preemptively with HTTP
+    Basic authentication.
+
+    Responses are always requested with gzip or deflate compression.  Request
+    bodies are sent uncompressed unless ``gzip_threshold`` is set, in which
+    case string bodies of at least that many bytes are gzipped and sent with
+    ``Content-Encoding: gzip``.  Check that your GeoServer accepts compressed
+    requests before enabling this.
+    """
+
+    def __init__(self, username=None, password=None, pool_size=4, timeout=None,
+            gzip_threshold=None):
+        assert pool_size > 0, "pool_size must be at least 1"
+        self.username = username
+        self.password = password
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.gzip_threshold = gzip_threshold
+        self._pools = dict()
+        self._lock = Lock()
+
+    def _connect(self, scheme, netloc):
+        http = httplib2.Http(timeout=self.timeout)
+        if self.username is not None:
+            http.add_credentials(self.username, self.password)
+            http.authorizations.append(
+                httplib2.BasicAuthentication(
+                    (self.username, self.password),
+                    netloc,
+                    "%s://%s/" % (scheme, netloc),
+                    {},
+                    None,
+                    None,
+                    http
+                    ))
+        return http
+
+    def _pool(self, uri):
+        parsed = urlparse(uri)
+        key = (parsed.scheme, parsed.netloc)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                logger.debug("opening connection pool for %s://%s", *key)
+                pool = _HostPool(lambda: self._connect(*key), self.pool_size)
+                self._pools[key] = pool
+            return pool
+
+    def _encode(self, body, headers):
+        if (self.gzip_threshold is not None and isinstance(body, str)
+                and len(body) >= self.gzip_threshold
+                and not _has_header(headers, "content-encoding")):
+            body = _gzip(body)
+            headers["Content-Encoding"] = "gzip"
+        return body
+
+    def request(self, uri, method="GET", body=None, headers=None):
+        headers = dict(headers or {})
+        if not _has_header(headers, "accept-encoding"):
+            headers["Accept-Encoding"] = "gzip, deflate"
+        body = self._encode(body, headers)
+        pool = self._pool(uri)
+        http = pool.acquire()
+        try:
+            result = http.request(uri, method, body, headers)
+        except:
+            # the connection may be left in an unknown state, so don't reuse it
+            pool.release(http, reuse=False)
+            raise
+        pool.release(http)
+        return result
@@ -1,4 +1,5 @@
-from geoserver.support import atom_link, xml_property, write_bool, ResourceInfo
+from geoserver.support import atom_link, xml_property, write_bool, ResourceInfo, \
+        _intern
 import string
 
 def workspace_from_index(catalog, node):
@@ -7,11 +8,12 @@ def workspace_from_index(catalog, node):
 
 class Workspace(ResourceInfo): 
     resource_type = "workspace"
+    __slots__ = ()
 
     def __init__(self, catalog, name):
         super(Workspace, self).__init__()
         self.catalog = catalog
-        self.name = name
+        self.name = _intern(name)
 
     @property
     def href(self):
@@ -25,7 +27,7 @@ class Workspace(ResourceInfo):
     def datastore_url(self):
         return "%s/workspaces/%s/datastores.xml" % (self.catalog.service_url, self.name)
 
-    enabled = xml_property("enabled", lambda x: string.lower(x) == 'true')
+    enabled = xml_property("enabled", lambda x: string.lower(x.text) == 'true')
     writers = dict(
         enabled = write_bool("enabled")
     )
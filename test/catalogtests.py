@@ -1,8 +1,22 @@
+import os
+import time
 import unittest
-from geoserver.catalog import Catalog, ConflictingDataError, UploadError
-from geoserver.support import ResourceInfo
+from cStringIO import StringIO
+from gzip import GzipFile
+from shutil import rmtree
+from tempfile import mkdtemp, mkstemp
+from threading import Event, Lock, Thread
+from xml.etree.ElementTree import XML
+from geoserver.cache import CacheEntry, CachePolicy, ResponseCache, \
+    SQLiteCache, thaw
+from geoserver.catalog import AmbiguousRequestError, Catalog, \
+    ConflictingDataError, FailedRequestError, UploadError
+from geoserver.support import ResourceInfo, index_entries
 from geoserver.layergroup import LayerGroup
+from geoserver.style import Style
+from geoserver.transport import Transport
 from geoserver.util import shapefile_and_friends
+import httplib2
 
 class CatalogTests(unittest.TestCase):
   def setUp(self):
@@ -63,6 +77,15 @@ class CatalogTests(unittest.TestCase):
     self.assertEqual("sfdem", self.cat.get_resource("sfdem", workspace=sf).name)
     self.assertEqual("sfdem", self.cat.get_resource("sfdem").name)
 
+  def testIterators(self):
+    topp = self.cat.get_workspace("topp")
+    states = self.cat.get_store("states_shapefile", topp)
+    self.assertEqual(9, len(list(self.cat.iter_stores())))
+    self.assertEqual(2, len(list(self.cat.iter_stores(topp))))
+    self.assertEqual(19, len(list(self.cat.iter_resources())))
+    self.assertEqual(["states"], [r.name for r in self.cat.iter_resources(states)])
+    self.assertEqual(len(self.cat.get_layers()), len(list(self.cat.iter_layers())))
+
 
   def testLayers(self):
     expected = set(["Arc_Sample", "Pk50095", "Img_Sample", "mosaic", "sfdem",
@@ -84,6 +107,12 @@ class CatalogTests(unittest.TestCase):
     self.assertEqual(set(s.name for s in states.styles), set(['pophatch', 'polygon']))
     self.assertEqual(states.default_style.name, "population")
 
+  def testLayersByReference(self):
+    states = self.cat.get_layer("states")
+    self.assert_("states" in [l.name for l in self.cat.get_layers(style="population")])
+    self.assert_("states" in [l.name for l in self.cat.get_layers(style="pophatch")])
+    self.assertEqual(["states"], [l.name for l in self.cat.get_layers(resource=states.resource)])
+
   def testLayerGroups(self):
     expected = set(["tasmania", "tiger-ny", "spearfish"])
     actual = set(l.name for l in self.cat.get_layergroups())
@@ -106,11 +135,79 @@ class CatalogTests(unittest.TestCase):
     self.assertEqual("population", self.cat.get_style("population").sld_name)
 
 
+  def testSnapshot(self):
+    snapshot = self.cat.snapshot()
+    self.assertEqual(7, len(snapshot.workspaces))
+    self.assertEqual(9, len(snapshot.stores))
+    self.assertEqual(19, len(snapshot.resources))
+    self.assertEqual("states_shapefile", snapshot.get_store("states_shapefile", "topp").name)
+    self.assertEqual("sfdem", snapshot.get_resource("sfdem", workspace="sf").name)
+    states = snapshot.get_resource("states")
+    self.assert_(snapshot.get(states.href) is states)
+    self.assertEqual(None, snapshot.get_layer("not_a_layer"))
+
+  def testIdentityMap(self):
+    cat = Catalog("http://localhost:8080/geoserver/rest", identity_map=True)
+    states = cat.get_resource("states")
+    self.assert_(states is cat.get_layer("states").resource)
+    self.assert_(states.store is cat.get_store("states_shapefile"))
+    self.assert_(cat.get_layer("states") is cat.get_layer("states"))
+    self.assert_(self.cat.get_layer("states") is not self.cat.get_layer("states"))
+
+  def testConcurrentRequests(self):
+    cat = Catalog("http://localhost:8080/geoserver/rest", pool_size=2)
+    results = []
+    def crawl():
+      results.append(len(cat.get_resources()))
+    threads = [Thread(target=crawl) for i in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    self.assertEqual([19] * 8, results)
+
+
 class ModifyingTests(unittest.TestCase):
   def setUp(self):
     self.cat = Catalog("http://localhost:8080/geoserver/rest")
 
 
+  def testWriteThrough(self):
+    cat = Catalog("http://localhost:8080/geoserver/rest", write_through=True)
+    rs = cat.get_resource("bugsites")
+    old_abstract = rs.abstract
+    rs.abstract = "Written through"
+    cat.save(rs)
+    self.assertEqual({}, rs.dirty)
+    self.assertEqual("Written through", rs.abstract)
+    self.assertEqual("Written through", cat.get_resource("bugsites").abstract)
+    self.assertEqual("Written through", self.cat.get_resource("bugsites").abstract)
+    rs.abstract = old_abstract
+    cat.save(rs)
+
+  def testSession(self):
+    rs = self.cat.get_resource("bugsites")
+    old_title = rs.title
+    with self.cat.session() as session:
+      rs.title = "Saved in a session"
+      session.save(rs)
+      self.assertEqual(1, len(session))
+      self.assertEqual(old_title, self.cat.get_resource("bugsites").title)
+    self.assertEqual("Saved in a session", self.cat.get_resource("bugsites").title)
+    rs.title = old_title
+    self.cat.save(rs)
+
+  def testBulkUpdate(self):
+    sf = self.cat.get_workspace("sf")
+    resources = self.cat.get_resources(workspace=sf)
+    old_abstracts = dict((rs.name, rs.abstract) for rs in resources)
+    result = self.cat.bulk_update(resources, abstract="Updated in bulk")
+    self.assertEqual([], result.failures)
+    self.assertEqual(len(resources), len(result.saved))
+    for rs in self.cat.get_resources(workspace=sf):
+      self.assertEqual("Updated in bulk", rs.abstract)
+    result = self.cat.bulk_update(resources,
+        update=lambda rs: setattr(rs, "abstract", old_abstracts[rs.name]))
+    self.assertEqual([], result.failures)
+
   def testFeatureTypeSave(self):
     # test saving round trip
     rs = self.cat.get_resource("bugsites")
@@ -456,5 +553,588 @@ class ModifyingTests(unittest.TestCase):
             timestamp='java.util.Date'))
     self.assert_(isinstance(layer, ResourceInfo))
 
+class ResponseCacheTests(unittest.TestCase):
+  def testEviction(self):
+    cache = ResponseCache(max_entries=3, max_bytes=100)
+    for i in range(4):
+      cache.put(str(i), CacheEntry("x" * 10, 60))
+    self.assertEqual(["1", "2", "3"], list(cache))
+    cache.get("1")
+    cache.put("big", CacheEntry("x" * 85, 60))
+    self.assertEqual(["1", "big"], list(cache))
+    self.assertEqual(3, cache.stats()["evictions"])
+
+  def testPolicy(self):
+    policy = CachePolicy([(r"/styles", 300), (r"/layers", 0)], default=5)
+    self.assertEqual(300, policy.ttl("/styles/point"))
+    self.assertEqual(0, policy.ttl("/layers"))
+    self.assertEqual(5, policy.ttl("/workspaces/topp"))
+
+    cache = ResponseCache(policy=policy)
+    cache.put("a", CacheEntry("<a/>", policy.ttl("/layers")))
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    self.assertEqual((0, 1, 1), (stats["hits"], stats["stale"], stats["misses"]))
+
+  def testSQLitePaths(self):
+    directory = mkdtemp()
+    try:
+      cache = SQLiteCache(directory)
+      for path in ["/layers", "/layers/roads", "/layersets", "/styles/point"]:
+        cache.put(path, CacheEntry("<a/>", 60, path=path))
+      cache.discard_paths(set(["/layers"]), set(["/layers/"]), lambda u: u)
+
+      # a new cache sees only what is on disk
+      cache = SQLiteCache(directory)
+      self.assertEqual([None, None, "/layersets", "/styles/point"],
+          [getattr(cache.get(u), "path", None)
+              for u in ["/layers", "/layers/roads", "/layersets", "/styles/point"]])
+      cache.clear()
+      self.assertEqual(None, SQLiteCache(directory).get("/layersets"))
+    finally:
+      rmtree(directory)
+
+class IndexEntriesTests(unittest.TestCase):
+  def testIndexEntries(self):
+    listing = ('<layers><layer><name>states</name><atom:link '
+        'xmlns:atom="http://www.w3.org/2005/Atom" href="http://x/states.xml"/>'
+        '</layer><layer><name>a&amp;b</name></layer></layers>')
+    self.assertEqual([("states", "http://x/states.xml"), ("a&b", None)],
+        index_entries(listing, "layer"))
+    self.assertEqual([], index_entries(listing, "style"))
+
+class FakeHttp(object):
+  """Stands in for httplib2.Http, recording what would have been sent."""
+
+  def __init__(self):
+    self.sent = []
+
+  def request(self, uri, method="GET", body=None, headers=None):
+    self.sent.append((uri, method, body, headers))
+    return httplib2.Response(dict(status="200")), ""
+
+class PooledTransportTests(unittest.TestCase):
+  def testCompression(self):
+    http = FakeHttp()
+    cat = Catalog(SERVICE, gzip_threshold=100)
+    cat.http._connect = lambda scheme, netloc: http
+    transport = cat.http
+    self.assertEqual(100, transport.gzip_threshold)
+
+    body = "<featureType>%s</featureType>" % ("x" * 200)
+    transport.request(SERVICE + "/a.xml", "PUT", body, {"Content-type": "application/xml"})
+    uri, method, sent, headers = http.sent[-1]
+    self.assertEqual("gzip", headers["Content-Encoding"])
+    self.assertEqual("gzip, deflate", headers["Accept-Encoding"])
+    self.assertEqual(body, GzipFile(fileobj=StringIO(sent)).read())
+
+    transport.request(SERVICE + "/a.xml", "PUT", "<small/>", {"Accept-Encoding": "identity"})
+    uri, method, sent, headers = http.sent[-1]
+    self.assertEqual("<small/>", sent)
+    self.assert_("Content-Encoding" not in headers)
+    self.assertEqual("identity", headers["Accept-Encoding"])
+
+    # without a threshold nothing is compressed
+    cat = Catalog(SERVICE)
+    cat.http._connect = lambda scheme, netloc: http
+    cat.http.request(SERVICE + "/a.xml", "PUT", body)
+    self.assertEqual(body, http.sent[-1][2])
+
+class AsyncCatalogTests(unittest.TestCase):
+  def testAsyncCatalog(self):
+    from geoserver.asynccatalog import AsyncCatalog
+    lock, arrived, all_arrived = Lock(), [], Event()
+    def handler(method, uri, headers):
+      if uri.endswith("/missing.xml"):
+        return 500, "Internal error"
+      if "/layers/" in uri:
+        # answer only once three layers are being fetched at the same time
+        with lock:
+          arrived.append(uri)
+          if len(arrived) == 3:
+            all_arrived.set()
+        all_arrived.wait(5)
+        return 200, "<layer><name>roads</name><enabled>true</enabled></layer>"
+      return 200, ("<layers>%s</layers>" % "".join(
+          "<layer><name>l%d</name></layer>" % i for i in range(3)))
+    http = StubTransport(handler)
+    called = []
+    with AsyncCatalog(SERVICE, transport=http, pool_size=3) as cat:
+      layers = [cat.get_layer("l%d" % i) for i in range(3)]
+      self.assertEqual(3, len([l.get(5) for l in layers]))
+      self.assert_(all_arrived.is_set())
+
+      missing = cat.get_xml(SERVICE + "/missing.xml")
+      self.assertRaises(FailedRequestError, missing.get, 5)
+
+      listed = cat.get_layers(fields=["enabled"], callback=called.append).get(5)
+    self.assertEqual([listed], called)
+    self.assert_(all(l.dom is not None for l in listed))
+
+class CatalogSnapshotTests(unittest.TestCase):
+  def testStoreNames(self):
+    from geoserver.resource import FeatureType
+    from geoserver.snapshot import CatalogSnapshot
+    from geoserver.store import DataStore
+    from geoserver.workspace import Workspace
+    cat = OfflineCatalog("<featureType/>")
+    topp, sf = Workspace(cat, "topp"), Workspace(cat, "sf")
+    roads, sfroads = DataStore(cat, topp, "roads"), DataStore(cat, sf, "roads")
+    main = FeatureType(cat, topp, roads, "main")
+    snapshot = CatalogSnapshot([topp, sf], [roads, sfroads],
+        [main, FeatureType(cat, sf, sfroads, "main")], [], [], [])
+    self.assert_(snapshot.get_resource("main", "roads", "topp") is main)
+    self.assert_(snapshot.get_resource("main", "roads", topp) is main)
+    self.assert_(snapshot.get_resource("main", roads) is main)
+    self.assertEqual([main], snapshot.get_resources("roads", topp))
+    self.assertRaises(AmbiguousRequestError, snapshot.get_resources, "roads")
+    self.assertRaises(FailedRequestError, snapshot.get_resource, "main", "rivers")
+
+class OfflineCatalog(object):
+  service_url = "http://localhost:8080/geoserver/rest"
+
+  def __init__(self, document):
+    self.document = document
+    self.fetches = 0
+
+  def get_xml(self, url):
+    self.fetches += 1
+    return XML(self.document)
+
+class ResourceInfoTests(unittest.TestCase):
+  def testCompact(self):
+    cat = OfflineCatalog("<style><name>point</name><filename>point.sld</filename></style>")
+    style = Style(cat, "point")
+    style.fetch()
+    style.compact(["filename"])
+    self.assertEqual(None, style.dom)
+    self.assertEqual("point.sld", style.filename)
+    self.assertEqual(1, cat.fetches)
+    self.assertRaises(AttributeError, setattr, style, "undeclared", 1)
+
+  def testDecoding(self):
+    cat = OfflineCatalog("<layerGroup><name>tasmania</name>"
+        "<layers><layer><name>roads</name></layer></layers>"
+        "<styles><style><name>line</name></style></styles></layerGroup>")
+    group = LayerGroup(cat, "tasmania")
+    self.assertEqual(["roads"], group.layers)
+    group.layers.append("rivers")
+    self.assertEqual(["roads"], group.layers)
+    self.assertEqual({}, group.dirty)
+    self.assertEqual(1, cat.fetches)
+    self.assertEqual(["line"], group.styles)
+    self.assertEqual(None, group.bounds)
+    group.layers = ["rivers"]
+    self.assertEqual(["rivers"], group.layers)
+    group.fetch()
+    self.assertEqual(2, cat.fetches)
+    self.assertEqual(["line"], group.styles)
+
+  def testChanged(self):
+    from geoserver.layer import Layer
+    cat = OfflineCatalog("<layer><name>roads</name><enabled>true</enabled>"
+        "<defaultStyle><name>line</name></defaultStyle>"
+        "<styles><style><name>point</name></style></styles></layer>")
+    layer = Layer(cat, "roads")
+    layer.enabled = True
+    self.assertEqual(["enabled"], layer.changed())
+    layer.fetch()
+    layer.default_style = Style(cat, "line")
+    layer.styles = ["point"]
+    self.assertEqual([], layer.changed())
+    layer.styles = []
+    self.assertEqual(["alternate_styles"], layer.changed())
+
+  def testMutateThenAssign(self):
+    cat = OfflineCatalog("<layerGroup><name>tasmania</name>"
+        "<layers><layer><name>roads</name></layer></layers></layerGroup>")
+    group = LayerGroup(cat, "tasmania")
+    layers = group.layers
+    layers.append("rivers")
+    group.layers = layers
+    self.assertEqual(["layers"], group.changed())
+    group.layers = ["roads"]
+    self.assertEqual([], group.changed())
+
+class StubTransport(Transport):
+  """
+  Answers requests by calling handler(method, url, headers), which returns
+  (status, content) or (status, content, response headers), and records
+  each request made.
+  """
+
+  def __init__(self, handler):
+    self.handler = handler
+    self.requests = []
+    self._lock = Lock()
+
+  def request(self, uri, method="GET", body=None, headers=None):
+    headers = dict(headers or {})
+    with self._lock:
+      self.requests.append((method, uri, headers))
+    result = self.handler(method, uri, headers)
+    status, content = result[:2]
+    response = dict(result[2]) if len(result) > 2 else dict()
+    response["status"] = str(status)
+    return httplib2.Response(response), content
+
+  def urls(self, method="GET"):
+    return [u for m, u, h in self.requests if m == method]
+
+SERVICE = "http://localhost:8080/geoserver/rest"
+
+class StubCatalogTests(unittest.TestCase):
+  def testConditionalGet(self):
+    url = SERVICE + "/styles/point.xml"
+    def handler(method, uri, headers):
+      if headers.get("If-None-Match") == '"v1"':
+        return 304, ""
+      return 200, "<style><name>point</name></style>", {"etag": '"v1"'}
+    http = StubTransport(handler)
+    cat = Catalog(SERVICE, transport=http)
+    self.assertEqual("point", cat.get_xml(url).findtext("name"))
+    entry = cat._cache.get(url)
+    entry.expires = 0
+    self.assertEqual("point", cat.get_xml(url).findtext("name"))
+    self.assertEqual('"v1"', http.requests[-1][2]["If-None-Match"])
+    # the 304 kept the cached entry and renewed it
+    self.assert_(cat._cache.get(url) is entry)
+    self.assert_(entry.is_fresh())
+    cat.get_xml(url)
+    self.assertEqual(2, len(http.requests))
+
+  def testKeepParsed(self):
+    url = SERVICE + "/layers.xml"
+    def handler(method, uri, headers):
+      return 200, ('<layers><layer a="1"><name>roads</name><atom:link '
+          'xmlns:atom="http://www.w3.org/2005/Atom" href="http://x/roads.xml"/>'
+          '</layer><layer><name>rivers</name></layer></layers>')
+    http = StubTransport(handler)
+    cat = Catalog(SERVICE, transport=http, cache=ResponseCache(keep_parsed=True))
+    tree = cat.get_xml(url)
+    self.assert_(cat.get_xml(url) is tree)
+    self.assert_(cat._cache.get(url).tree is tree)
+    self.assertEqual(1, len(http.requests))
+
+    layer = tree[0]
+    self.assertRaises(TypeError, setattr, layer, "text", "changed")
+    self.assertRaises(TypeError, tree.append, XML("<layer/>"))
+    self.assertRaises(TypeError, layer.attrib.__setitem__, "a", "2")
+    self.assertRaises(TypeError, layer.set, "a", "2")
+    self.assertEqual("1", layer.get("a"))
+
+    copy = thaw(tree)
+    copy[0].set("a", "2")
+    copy[0].find("name").text = "lanes"
+    copy.append(XML("<layer/>"))
+    self.assertEqual(3, len(copy))
+    self.assertEqual(2, len(tree))
+    self.assertEqual(("1", "roads"), (layer.get("a"), layer.findtext("name")))
+
+    # listings read from the kept tree
+    self.assertEqual([("roads", "http://x/roads.xml"), ("rivers", None)],
+        cat.get_index(url, "layer"))
+    self.assertEqual(["roads", "rivers"],
+        [n.findtext("name") for n in cat.iter_xml(url, "layer")])
+    self.assertEqual(1, len(http.requests))
+
+  def testSingleFlight(self):
+    url = SERVICE + "/layers.xml"
+    started, release = Event(), Event()
+    status = [200]
+    def handler(method, uri, headers):
+      started.set()
+      release.wait()
+      return status[0], "<layers/>"
+    http = StubTransport(handler)
+    cat = Catalog(SERVICE, transport=http)
+
+    def read_concurrently():
+      outcomes = []
+      def read():
+        try:
+          outcomes.append(cat.get_xml(url).tag)
+        except FailedRequestError, e:
+          outcomes.append(e)
+      threads = [Thread(target=read) for i in range(5)]
+      threads[0].start()
+      started.wait()
+      for t in threads[1:]:
+        t.start()
+      time.sleep(0.2)
+      release.set()
+      for t in threads:
+        t.join()
+      started.clear()
+      release.clear()
+      return outcomes
+
+    self.assertEqual(["layers"] * 5, read_concurrently())
+    self.assertEqual(1, len(http.requests))
+
+    cat._cache.clear()
+    status[0] = 500
+    errors = read_concurrently()
+    self.assertEqual(2, len(http.requests))
+    self.assertEqual(5, len(errors))
+    # every caller gets the leader's exception
+    self.assert_(all(e is errors[0] for e in errors))
+    self.assert_(isinstance(errors[0], FailedRequestError))
+
+  CACHED = ["/workspaces", "/workspaces/topp", "/workspaces/sf",
+      "/workspaces/topp/datastores", "/workspaces/topp/datastores/states",
+      "/workspaces/topp/datastores/roads",
+      "/workspaces/topp/datastores/states/featuretypes",
+      "/workspaces/topp/datastores/states/featuretypes/states",
+      "/namespaces", "/namespaces/topp", "/layers", "/layers/states",
+      "/layergroups", "/layergroups/tasmania", "/styles", "/styles/point"]
+
+  def evicted(self, url, method):
+    """The CACHED paths a write of url evicts."""
+    def handler(method, uri, headers):
+      self.fail("unexpected request for " + uri)
+    cat = Catalog(SERVICE, transport=StubTransport(handler))
+    for path in self.CACHED:
+      cat._cache.put(SERVICE + path + ".xml", CacheEntry("<x/>", 60))
+    cat._invalidate(SERVICE + url, method)
+    return sorted(set(self.CACHED) - set(cat._cache_path(u) for u in cat._cache))
+
+  def testInvalidation(self):
+    states = "/workspaces/topp/datastores/states"
+    self.assertEqual(sorted(["/layers",
+        states + "/featuretypes", states + "/featuretypes/states"]),
+        self.evicted(states + "/featuretypes/states.xml", "PUT"))
+    self.assertEqual(sorted(["/layers", "/workspaces/topp/datastores", states,
+        states + "/featuretypes", states + "/featuretypes/states"]),
+        self.evicted(states + "/file.shp?update=overwrite", "PUT"))
+    self.assertEqual(sorted(["/layers", "/layers/states", "/layergroups",
+        "/layergroups/tasmania", "/workspaces/topp/datastores", states,
+        states + "/featuretypes", states + "/featuretypes/states"]),
+        self.evicted(states + ".xml?purge=true", "DELETE"))
+    self.assertEqual(["/styles", "/styles/point"],
+        self.evicted("/styles?name=point", "POST"))
+    self.assertEqual(["/layers", "/workspaces/topp/datastores",
+        "/workspaces/topp/datastores/roads"],
+        self.evicted("/workspaces/topp/datastores?name=roads", "POST"))
+    self.assertEqual(["/styles", "/styles/point"],
+        self.evicted("/styles/point.sld", "PUT"))
+
+  def testCreateEvictsMisses(self):
+    created = []
+    def handler(method, uri, headers):
+      if method == "PUT":
+        created.append(uri)
+        return 201, ""
+      elif uri == SERVICE + "/workspaces.xml":
+        return 200, "<workspaces><workspace><name>topp</name></workspace></workspaces>"
+      elif uri == SERVICE + "/layers/roads.xml" and created:
+        return 200, "<layer><name>roads</name></layer>"
+      return 404, "No such object"
+    http = StubTransport(handler)
+    cat = Catalog(SERVICE, transport=http)
+    self.assertEqual(None, cat.get_layer("roads"))
+    self.assertEqual(None, cat.get_layer("roads"))
+    self.assertEqual(1, http.urls().count(SERVICE + "/layers/roads.xml"))
+
+    handle, archive = mkstemp()
+    os.close(handle)
+    cat.create_featurestore("roads", archive)
+    self.assertEqual(1, len(created))
+    self.assertEqual("roads", cat.get_layer("roads").name)
+
+  def testLayerIndexExpiry(self):
+    styles = {"roads": "line"}
+    def handler(method, uri, headers):
+      if uri == SERVICE + "/layers.xml":
+        return 200, "<layers><layer><name>roads</name></layer></layers>"
+      return 200, ("<layer><name>roads</name><defaultStyle><name>%s</name>"
+          "</defaultStyle></layer>" % styles["roads"])
+    cache = ResponseCache(policy=CachePolicy([(r"/layers", 0.2)]))
+    cat = Catalog(SERVICE, transport=StubTransport(handler), cache=cache)
+    self.assertEqual(["roads"], [l.name for l in cat.get_layers(style="line")])
+    styles["roads"] = "dashed"
+    self.assertEqual(["roads"], [l.name for l in cat.get_layers(style="line")])
+    time.sleep(0.3)
+    self.assertEqual([], cat.get_layers(style="line"))
+    self.assertEqual(["roads"], [l.name for l in cat.get_layers(style="dashed")])
+
+  def testSaveMutatedList(self):
+    def handler(method, uri, headers):
+      return 200, ("<featureType><name>main</name>"
+          "<keywords><string>a</string></keywords></featureType>")
+    from geoserver.resource import FeatureType
+    from geoserver.store import DataStore
+    http = StubTransport(handler)
+    cat = Catalog(SERVICE, transport=http)
+    topp = cat.get_default_workspace()
+    ft = FeatureType(cat, topp, DataStore(cat, topp, "roads"), "main")
+    ft.fetch()
+    keywords = ft.keywords
+    keywords.append("b")
+    ft.keywords = keywords
+    self.assertEqual(True, cat.save(ft))
+    self.assertEqual(1, len(http.urls("PUT")))
+    ft.keywords = ["a"]
+    self.assertEqual(False, cat.save(ft))
+
+  def testSessionRanks(self):
+    created = set()
+    def handler(method, uri, headers):
+      path = uri[len(SERVICE):]
+      if method == "PUT" and path.startswith("/workspaces/topp/datastores/newds/file"):
+        created.add("/workspaces/topp/datastores/newds.xml")
+        return 201, ""
+      elif method == "POST":
+        created.add("/workspaces/topp/datastores/newds/featuretypes/points.xml")
+        return 201, ""
+      elif path == "/workspaces/topp.xml" or path in created:
+        return 200, "<x><name>%s</name></x>" % path.split("/")[-1][:-4]
+      return 404, "No such object"
+    http = StubTransport(handler)
+    cat = Catalog(SERVICE, transport=http)
+    topp = cat.get_workspace("topp")
+    handle, archive = mkstemp()
+    os.close(handle)
+    with cat.session() as session:
+      # the layer is created after its store, and must find it
+      session.create_native_layer("topp", "newds", "points", "points",
+          "Points", "EPSG:4326", [("the_geom", "com.vividsolutions.jts.geom.Point")])
+      session.create_featurestore("newds", archive, topp)
+    self.assertEqual(2, len(created))
+
+  def testLazyStyles(self):
+    def handler(method, uri, headers):
+      if uri.endswith("/layers/roads.xml"):
+        return 200, ("<layer><name>roads</name><defaultStyle><name>line</name>"
+            "</defaultStyle><styles><style><name>point</name></style>"
+            "<style><name>missing</name></style></styles></layer>")
+      elif uri.endswith("/styles/missing.xml"):
+        return 404, "No such style"
+      return 200, "<style><name>%s</name></style>" % uri.split("/")[-1][:-4]
+    http = StubTransport(handler)
+    cat = Catalog(SERVICE, transport=http)
+    def style_requests():
+      return len([u for u in http.urls() if "/styles/" in u])
+
+    layer = cat.get_layer("roads")
+    self.assertEqual("line", layer.default_style.name)
+    self.assertEqual(["point", "missing"], [s.name for s in layer.styles])
+    self.assertEqual(0, style_requests())
+
+    self.assertEqual("line", layer.get_default_style(validate=True).name)
+    self.assertEqual(["point", None],
+        [getattr(s, "name", None) for s in layer.get_styles(validate=True)])
+    self.assertEqual(3, style_requests())
+
+    layer.default_style = "missing"
+    self.assertEqual(None, layer.get_default_style(validate=True))
+    layer.styles = [Style(cat, "missing"), "point"]
+    self.assertEqual(["point"],
+        [s.name for s in layer.get_styles(validate=True) if s is not None])
+    self.assertEqual(None, layer.get_styles(validate=True)[0])
+
+  def testPrefetch(self):
+    lock, running = Lock(), [0, 0]
+    def handler(method, uri, headers):
+      path = uri[len(SERVICE):]
+      if path == "/layers.xml":
+        return 200, "<layers>%s</layers>" % "".join(
+            "<layer><name>l%d</name></layer>" % i for i in range(6))
+      elif path.startswith("/layers/"):
+        with lock:
+          running[0] += 1
+          running[1] = max(running)
+        time.sleep(0.05)
+        with lock:
+          running[0] -= 1
+        return 200, ('<layer><name>%s</name><enabled>true</enabled><resource>'
+            '<name>roads</name><atom:link xmlns:atom="http://www.w3.org/2005/Atom" '
+            'href="%s/workspaces/topp/datastores/ds/featuretypes/roads.xml"/>'
+            '</resource></layer>' % (path[8:-4], SERVICE))
+      return 200, "<featureType><name>roads</name><srs>EPSG:4326</srs></featureType>"
+    http = StubTransport(handler)
+    cat = Catalog(SERVICE, transport=http, pool_size=2)
+
+    layers = cat.get_layers(fields=["enabled"])
+    self.assertEqual(2, running[1])
+    self.assertEqual(7, len(http.requests))
+    self.assertEqual([True] * 6, [l.enabled for l in layers])
+    self.assertEqual(7, len(http.requests))
+
+    # dotted fields fetch the objects they pass through
+    layers = cat.get_layers(fields=["resource.projection"])
+    resource = SERVICE + "/workspaces/topp/datastores/ds/featuretypes/roads.xml"
+    self.assertEqual(1, http.urls().count(resource))
+    self.assertEqual(["EPSG:4326"] * 6, [l.resource.projection for l in layers])
+    self.assertEqual(8, len(http.requests))
+
+    # compacting without fields keeps every value
+    layers = cat.get_layers(prefetch=True, keep_dom=False)
+    self.assertEqual([True] * 6, [l.enabled for l in layers])
+    self.assertEqual([None] * 6, [l.dom for l in layers])
+
+  def testIdentityMapExpiry(self):
+    from geoserver.layer import Layer
+    from geoserver.resource import FeatureType
+    from geoserver.store import DataStore
+    from geoserver.workspace import Workspace
+    def handler(method, uri, headers):
+      self.fail("unexpected request for " + uri)
+    cat = Catalog(SERVICE, transport=StubTransport(handler), identity_map=True)
+    topp = cat._shared(Workspace(cat, "topp"))
+    ds = cat._shared(DataStore(cat, topp, "ds"))
+    other = cat._shared(DataStore(cat, topp, "other"))
+    objects = dict(topp=topp, ds=ds, other=other,
+        roads=cat._shared(FeatureType(cat, topp, ds, "roads")),
+        rivers=cat._shared(FeatureType(cat, topp, ds, "rivers")),
+        lakes=cat._shared(FeatureType(cat, topp, other, "lakes")),
+        layer=cat._shared(Layer(cat, "roads")),
+        style=cat._shared(Style(cat, "point")))
+    for obj in objects.values():
+      obj.dom = XML("<x/>")
+    def expired():
+      return sorted(k for k, obj in objects.items() if obj.dom is None)
+
+    cat._invalidate(objects["roads"].href, "PUT")
+    self.assertEqual(["roads"], expired())
+    cat._invalidate(ds.href + "?purge=true", "DELETE")
+    self.assertEqual(["ds", "layer", "rivers", "roads"], expired())
+    self.assertEqual(8, len(cat._stub_paths.values()))
+
+    # collected objects drop out of the index
+    del objects["style"]
+    line = cat._shared(Style(cat, "line"))
+    self.assertEqual(8, len(cat._stub_paths.values()))
+    self.assertEqual([("line")], [k[1] for k in cat._stub_paths._root["styles"]])
+
+  def testSharing(self):
+    def handler(method, uri, headers):
+      if "/datastores/" in uri:
+        return 200, "<dataStore><name>roads</name><enabled>true</enabled></dataStore>"
+      return 404, "No such object"
+    http = StubTransport(handler)
+    cat = Catalog(SERVICE, transport=http)
+    topp = cat.get_default_workspace()
+    store = cat.get_store("roads", topp)
+    store.enabled = False
+    other = cat.get_store("roads", topp)
+    self.assert_(other is not store)
+    self.assertEqual(True, other.enabled)
+
+    cat = Catalog(SERVICE, transport=http, identity_map=True)
+    topp = cat.get_default_workspace()
+    self.assert_(cat.get_store("roads", topp) is cat.get_store("roads", topp))
+
+  def testWorkspaceInvalidation(self):
+    # workspaces and namespaces mirror each other, along with all they contain
+    topp = sorted(["/namespaces", "/namespaces/topp", "/workspaces"] +
+        [p for p in self.CACHED if p.startswith("/workspaces/topp")])
+    self.assertEqual(topp, self.evicted("/namespaces/topp", "POST"))
+    self.assertEqual(topp, self.evicted("/workspaces/topp.xml", "PUT"))
+    self.assertEqual(sorted(["/namespaces", "/workspaces", "/workspaces/sf",
+        "/layers", "/layers/states", "/layergroups", "/layergroups/tasmania"]),
+        self.evicted("/workspaces/sf.xml", "DELETE"))
+
 if __name__ == "__main__":
   unittest.main()